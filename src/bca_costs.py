@@ -0,0 +1,221 @@
+## BCA_COSTS.PY
+# Roadway benefit-cost engine for BCA_calc_3.py
+# Per-class VMT and VHT are held as links x vehicle-class matrices, and bca_parameters.csv values
+# are laid out as matrices of cost per VMT/VHT with a row per variant (urban/rural for noise,
+# non-interstate/interstate for safety). Each link's variant is picked by row index, so every
+# total_r_* cost is one array operation over all links and classes.
+# The highway summary table is summed from the same matrices, so the per-class VMT/VHT/PMT/PHT
+# (and congested) columns are never added to the links frame -- each extra class is one matrix column.
+
+import numpy as np
+import pandas as pd
+import link_metrics
+import transit_metrics
+
+#vehicle classes -- matrix column order
+AUTO_CLASSES = link_metrics.AUTO_CLASSES
+FREIGHT_CLASSES = link_metrics.FREIGHT_CLASSES
+CLASSES = AUTO_CLASSES + FREIGHT_CLASSES
+
+#select link / environmental justice class volumes -- in punchlink only for runs assigned with
+#select link classes. turned on with sl_classes = 1 in bca_parameters.csv (summary only, no costs)
+SL_CLASSES = ['slcl1', 'slcl2', 'slcl3', 'slcl4', 'slcl5', 'slcl6', 'slcl7', 'slvol', 'ejcl1', 'ejcl2', 'ejcl3', 'ejcl4', 'ejvol']
+
+#persons per vehicle for PMT/PHT ('hov3' comes from bca_parameters.csv, pvt_vehicles is the sum of the others)
+OCCUPANCY = {'sov': 1, 'hov2': 2}
+
+#roadway cost columns added by costs()
+COST_COLS = ['total_r_vot', 'total_r_op_cost', 'total_r_safety_cost', 'total_r_noise_cost', 'total_r_reliability_cost']
+
+#vdf of interstate links (for safety rates)
+INTERSTATE_VDF = [2, 3, 4, 5, 8]
+
+#highest atype that counts as urban for noise costs (see the atype key in BCA_calc_3.py)
+URBAN_ATYPE = 8
+
+
+## ------------------------
+## VMT / VHT MATRICES
+## ------------------------
+
+def class_matrices(links, classes=CLASSES):
+    """Per-class VMT and VHT on each link, as (links x classes) arrays. VHT uses the LOS C adjusted speeds."""
+    vmt = links[classes].to_numpy(dtype=float) * links['len'].to_numpy(dtype=float)[:, None]
+    mph = links['mph'].to_numpy(dtype=float)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vht = np.where(mph > 0, vmt / mph, 0)
+    return vmt, vht
+
+
+def person_matrices(links, parameters):
+    """Auto PMT and PHT on each link, as (links x AUTO_CLASSES) arrays -- pvt_vehicles is the sum of the others."""
+    auto = [c for c in AUTO_CLASSES if c != 'pvt_vehicles']
+    occupancy = np.array([dict(OCCUPANCY, hov3=parameters['occupancy_hov3'])[c] for c in auto])
+    pmt = links[auto].to_numpy(dtype=float) * occupancy * links['len'].to_numpy(dtype=float)[:, None]
+    mph = links['mph'].to_numpy(dtype=float)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pht = np.where(mph > 0, pmt / mph, 0)
+    #pvt_veh = sum(sov, hov)
+    pmt = np.column_stack([pmt, pmt[:, 0] + pmt[:, 1] + pmt[:, 2]])
+    pht = np.column_stack([pht, pht[:, 0] + pht[:, 1] + pht[:, 2]])
+    return pmt, pht
+
+
+def class_summary(links, vmt, vht, pmt, pht, groups, classes=CLASSES):
+    """Totals by time period for the highway summary table, straight from the class matrices.
+
+    class volumes, VMT, VHT, congested VMT/VHT for each class, PMT/PHT and congested PMT/PHT for
+    autos, plus len and lanemi -- for every level (e.g. region, project links) of groups, a
+    levels.LevelGroups of the links. returns {level: frame indexed by timeperiod}, with columns
+    named like '{class}_cvmt'.
+    """
+    congested = links['congested'].to_numpy()[:, None]
+    cols = dict([[level, {}] for level in groups.levels])
+    for suffix, m, names in [
+        ['', links[classes].to_numpy(dtype=float), classes],
+        ['_vmt', vmt, classes], ['_vht', vht, classes],
+        ['_cvmt', vmt * congested, classes], ['_cvht', vht * congested, classes],
+        ['_pmt', pmt, AUTO_CLASSES], ['_cpmt', pmt * congested, AUTO_CLASSES],
+        ['_pht', pht, AUTO_CLASSES], ['_cpht', pht * congested, AUTO_CLASSES]
+    ]:
+        total = groups.sums(m)
+        for level in groups.levels:
+            cols[level].update(dict([[f'{c}{suffix}', total[level][:, i]] for i, c in enumerate(names)]))
+    total = groups.sums(links[['len', 'lanemi']].to_numpy(dtype=float))
+    counts = groups.counts()
+    summaries = {}
+    for level in groups.levels:
+        cols[level]['len'], cols[level]['lanemi'] = total[level][:, 0], total[level][:, 1]
+        #time periods the level has links in
+        summaries[level] = pd.DataFrame(cols[level], index=pd.Index(groups.periods, name='timeperiod'))[counts[level] > 0]
+    return summaries
+
+
+## ------------------------
+## COSTS
+## ------------------------
+
+def coefficients(parameters, classes=CLASSES):
+    """bca_parameters.csv costs as arrays, annualized and in present value.
+
+    noise: [urban, rural] x classes, per VMT
+    op: classes, per VMT
+    vot: classes, per VHT
+    safety: [non-interstate, interstate] x [K+A, crashes], per VMT
+    classes without a cost (e.g. long-haul trucks) get 0. parameter values can also be arrays of
+    draws (all the same length, see monte_carlo.py) -- each array then gets a trailing draws axis.
+    """
+    k = len(classes)
+    col = dict([[c, i] for i, c in enumerate(classes)])
+    factor = parameters['ann_factor'] * parameters['pv_deprec_rate']
+    draws = np.shape(factor)
+
+    noise = np.zeros((2, k) + draws)
+    for c, p in [['pvt_vehicles', 'allveh'], ['ltruck', 'ltruck'], ['mtruck', 'bustruck'], ['htruck', 'bustruck'], ['bus', 'bustruck']]:
+        noise[:, col[c]] = [parameters[f'N_{p}_urban'], parameters[f'N_{p}_rural']]
+
+    op = np.zeros((k,) + draws)
+    for c, p in [['pvt_vehicles', 'auto'], ['bplate', 'bplate'], ['ltruck', 'ltruck'], ['mtruck', 'mtruck'], ['htruck', 'htruck']]:
+        op[col[c]] = parameters[f'OC_{p}']
+
+    ## NOTE -- right now we don't have pvt_vehicles separated by work and non-work-- need partial demand traffic assignment for that
+    ## for now, a percentage (based on parquet files)-- work trips are 27% of total trips and VHT, non-work is 73% of total trips and VHT
+    vot = np.zeros((k,) + draws)
+    vot[col['pvt_vehicles']] = 0.27 * parameters['VOT_inv_work'] + 0.73 * parameters['VOT_inv_nw']
+    for c in ['bplate', 'ltruck', 'mtruck', 'htruck']:
+        vot[col[c]] = parameters[f'VOT_{c}']
+
+    #K+A and crash rates are per 100,000,000 VMT
+    rates = np.array([
+        [parameters['SAFE_nikarate'], parameters['SAFE_nicrashrate']],
+        [parameters['SAFE_ikarate'], parameters['SAFE_icrashrate']]
+    ]) / 100000000
+    safety = rates * np.array([parameters['SAFE_ka'], parameters['SAFE_pdo']])
+
+    return {'noise': noise * factor, 'op': op * factor, 'vot': vot * factor, 'safety': safety * factor}
+
+
+def costs(links, vmt, vht, parameters, classes=CLASSES):
+    """total_r_* roadway costs on each link (COST_COLS), on links' index."""
+    coef = coefficients(parameters, classes)
+    rural = (links['atype'].to_numpy() > URBAN_ATYPE).astype(int)
+    interstate = links['vdf'].isin(INTERSTATE_VDF).to_numpy().astype(int)
+
+    return pd.DataFrame({
+        'total_r_vot': vht @ coef['vot'],
+        'total_r_op_cost': vmt @ coef['op'],
+        'total_r_safety_cost': links['all_vmt'].to_numpy(dtype=float) * coef['safety'][interstate].sum(axis=1),
+        'total_r_noise_cost': (vmt * coef['noise'][rural]).sum(axis=1),
+        'total_r_reliability_cost': 0     #nothing yet -- reviewing methodology. dummy value for now
+    }, index=links.index)
+
+
+## ------------------------
+## STATISTICS
+## ------------------------
+# every BCA cost is linear in bca_parameters.csv values, so a run's BCA table can be rebuilt for any
+# parameters from a few parameter-independent totals (VMT by class and urban/rural, VHT by class,
+# VMT by interstate/non-interstate, pollutant tons, transit vehicle miles and passenger hours).
+# BCA_calc_3.py saves them to results\bca_statistics.csv, bca_recalc.py applies parameters to them.
+
+#emissions tons (from BCA_calc_3.py) and the bca_parameters.csv cost per ton for each pollutant
+POLLUTANT_COSTS = {'co2e': 'POLL_ghg', 'pm': 'POLL_pm25', 'voc': 'POLL_voc', 'nox': 'POLL_nox'}
+
+
+def statistics_path(run):
+    return run + '\\Database\\rsp_evaluation\\results\\bca_statistics.csv'
+
+
+def present_value(parameters, scen_year, curr_year):
+    """Parameters plus pv_deprec_rate, the discount factor from curr_year to scen_year."""
+    parameters = dict(parameters)
+    parameters['pv_deprec_rate'] = 1 / (1+parameters['discount_rate'])**(scen_year - curr_year)
+    return parameters
+
+
+def link_statistics(links, vmt, vht, rows=None, classes=CLASSES):
+    """Parameter-independent roadway totals for the links in rows (default: all) -- see STATISTICS above."""
+    rows = np.ones(len(links), dtype=bool) if rows is None else np.asarray(rows, dtype=bool)
+    rural = links['atype'].to_numpy() > URBAN_ATYPE
+    interstate = links['vdf'].isin(INTERSTATE_VDF).to_numpy()
+    all_vmt = links['all_vmt'].to_numpy(dtype=float)
+
+    stats = {}
+    urban_vmt = vmt[rows & ~rural].sum(axis=0)
+    rural_vmt = vmt[rows & rural].sum(axis=0)
+    class_vht = vht[rows].sum(axis=0)
+    for i, c in enumerate(classes):
+        stats[f'{c}_vmt_urban'] = urban_vmt[i]
+        stats[f'{c}_vmt_rural'] = rural_vmt[i]
+        stats[f'{c}_vht'] = class_vht[i]
+    stats['all_vmt_noninterstate'] = all_vmt[rows & ~interstate].sum()
+    stats['all_vmt_interstate'] = all_vmt[rows & interstate].sum()
+    return stats
+
+
+def bca_totals(s, parameters, classes=CLASSES):
+    """BCA table values for one row of saved statistics -- {column: value}, or {column: array} for arrays of parameter draws."""
+    p = present_value(parameters, s['scen_year'], s['curr_year'])
+    coef = coefficients(p, classes)
+    urban = np.array([s[f'{c}_vmt_urban'] for c in classes])
+    rural = np.array([s[f'{c}_vmt_rural'] for c in classes])
+    vht = np.array([s[f'{c}_vht'] for c in classes])
+    trnt = transit_metrics.cost_totals(s, p)
+    totals = {
+        'Total Travel Time Cost': vht @ coef['vot'] + trnt['total_trnt_vot'],
+        'Total Vehicle Operating Cost (based on vehicle miles)': (urban + rural) @ coef['op'] + trnt['total_trnt_op_cost'],
+        'Total Safety Cost (vehicular crashes and injuries)': s['all_vmt_noninterstate'] * coef['safety'][0].sum(axis=0) + s['all_vmt_interstate'] * coef['safety'][1].sum(axis=0),
+        'Total Noise Cost': urban @ coef['noise'][0] + rural @ coef['noise'][1] + trnt['total_trnt_noise_cost'],
+        'Total Reliability Cost': 0 * p['ann_factor'],
+        'Total Emissions Cost': sum(s[f'{x}_tons'] * p[POLLUTANT_COSTS[x]] * p['pv_deprec_rate'] for x in POLLUTANT_COSTS)
+    }
+    totals['Total Costs'] = sum(totals.values())
+    return totals
+
+
+def bca_table(stats, parameters, classes=CLASSES):
+    """bcasummary_out.csv table from saved statistics (one row per geog) and any bca_parameters.csv values."""
+    rows = []
+    for _, s in stats.reset_index(drop=True).iterrows():
+        rows.append(dict(geog=s['geog'], **bca_totals(s, parameters, classes)))
+    return pd.DataFrame(rows)
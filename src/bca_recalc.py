@@ -0,0 +1,40 @@
+## BCA_RECALC.PY
+# Recalculates BCA tables (bcasummary_out.csv) for new bca_parameters.csv values without rerunning
+# BCA_calc_3.py -- applies the parameters to the totals it saved in results\bca_statistics.csv
+# (see bca_costs.py). No punchlink, Emme or link calculations needed.
+#
+# usage: python bca_recalc.py <bca_parameters.csv> <cmap_trip-based_model folder> [<more run folders> ...] [--output <csv>]
+
+import os
+import time
+import argparse
+import pandas as pd
+import bca_costs
+import rsp_measures
+
+
+def recalc(parameters, runs):
+    """BCA tables for each run folder with the given {parameter: value}s, in one frame with a 'run' column."""
+    tables = []
+    for run in runs:
+        stats = pd.read_csv(bca_costs.statistics_path(run))
+        table = bca_costs.bca_table(stats, parameters)
+        table.insert(0, 'run', os.path.basename(os.path.dirname(os.path.abspath(run))))
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recalculate BCA tables from saved statistics with new parameters.')
+    parser.add_argument('params', help='bca_parameters.csv to apply')
+    parser.add_argument('runs', nargs='+', help="'cmap_trip-based_model' folders that BCA_calc_3.py has been run on")
+    parser.add_argument('--output', default=None, help='csv to write the tables to (default: print only)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    bca = recalc(rsp_measures.read_parameters(args.params), args.runs)
+    print(bca.to_string(index=False))
+    print(f'Recalculated {len(args.runs)} run(s) in {time.perf_counter() - start:.3f} s')
+    if args.output:
+        bca.to_csv(args.output, index=False)
+        print(f'Table exported to {args.output}')
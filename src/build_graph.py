@@ -0,0 +1,312 @@
+## BUILD_GRAPH.PY
+# Decides which RSP evaluation outputs need to be (re)built
+# Each output-producing stage (geography export, congestion metrics, emissions, no-build baseline, and
+# BCA when asked for) lists the files
+# it reads. When a stage finishes, the fingerprint of each input is recorded in the run's
+# Database\rsp_evaluation\results\build_manifest.json. A stage is rebuilt when one of its
+# outputs is missing, when it has no record (e.g. outputs from before this file existed),
+# or when any input changed since the record was made -- including the scripts themselves.
+#
+# Small files (scripts, bca_parameters.csv, select link/line files) are fingerprinted by content,
+# big model outputs (punchlink.csv, emmebank) and the MOVES rate/EDA share tables on the M: drive
+# (RATE_FILES) by size and modified time.
+#
+# usage: python build_graph.py <folder of RSP runs> [--dry-run] [--adopt] [--params <bca_parameters.csv>]
+#   --dry-run  list what would be rebuilt, and why, without building anything
+#   --adopt    record existing outputs as current without rebuilding them (one-off, after checking them)
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+import datetime as dt
+import model_runs
+
+src = os.path.dirname(os.path.abspath(__file__))
+
+#python files each stage runs (a change to any of them rebuilds the stage)
+STAGE_SCRIPTS = {
+    'geography': ['GetRSPCorridorInfo_SingleProject.bat', 'export_geog.py', 'network.py', 'transit_metrics.py', 'select_by_location.py', 'corridor.py'],
+    'congestion': ['congestion_metrics_EDA.py', 'congestion_links.py', 'link_metrics.py', 'link_keys.py', 'levels.py', 'punchlink.py', 'colstore.py'],
+    'emissions': ['rsp_emissions_2.py', 'moves.py', 'link_metrics.py', 'punchlink.py', 'colstore.py'],
+    'baseline': ['nobuild_baseline.py', 'rsp_measures.py', 'link_delta.py', 'link_keys.py', 'congestion_links.py', 'punchlink.py', 'colstore.py'],
+    'bca': ['BCA_calc_3.py', 'bca_costs.py', 'moves.py', 'link_metrics.py', 'network.py', 'transit_metrics.py', 'link_keys.py', 'levels.py', 'punchlink.py', 'colstore.py'],
+    'compare': ['rsp_measures.py', 'nobuild_baseline.py', 'link_delta.py', 'link_keys.py', 'congestion_links.py', 'model_runs.py', 'punchlink.py', 'colstore.py']
+}
+#stages only in the graph when asked for (graph(optional=...)) -- BCA needs Emme (or recorded network data, see network.py)
+OPTIONAL_STAGES = ['bca']
+
+#tables on the M: drive each stage reads -- the same paths rsp_emissions_2.py and BCA_calc_3.py read them from
+RATES = r"M:\GHG Estimation Package\aa_GHG_VMT\rates"
+RATE_FILES = {
+    'emissions': [
+        RATES + r"\GHG query output\GHG running 2050.csv",
+        RATES + r"\PM query output\PM running 2050.csv",
+        r"M:\rsp_evaluation\ON_TO_2050_Plan_Update\Inputs\excl_pop_share.csv"
+    ],
+    'bca': [
+        RATES + r"\GHG query output\GHG running 2050.csv",
+        RATES + r"\PM query output\PM running 2050.csv",
+        RATES + r"\VOC query output\VOC running 2050.csv",
+        RATES + r"\NOx query output\NOx running 2050.csv"
+    ]
+}
+
+#files bigger than this are fingerprinted by size/modified time instead of content
+CONTENT_LIMIT = 16 * 1024**2
+#so are the M: drive tables, whatever their size -- not read over the network on every check (as colstore.cached_csv() keys them)
+STAT_FILES = set(f for files in RATE_FILES.values() for f in files)
+
+
+## ------------------------
+## FINGERPRINTS AND MANIFESTS
+## ------------------------
+
+def fingerprint(path):
+    """Fingerprint of one version of a file -- sha1 of the content for small files, size/mtime for big ones and STAT_FILES. None if missing."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if stat.st_size > CONTENT_LIMIT or path in STAT_FILES:
+        return f"size={stat.st_size};mtime={stat.st_mtime_ns}"
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024**2), b''):
+            sha.update(block)
+    return 'sha1=' + sha.hexdigest()
+
+
+def manifest_path(run_dir):
+    return run_dir + '\\Database\\rsp_evaluation\\results\\build_manifest.json'
+
+
+def read_manifest(run_dir):
+    try:
+        with open(manifest_path(run_dir), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def record(stage):
+    """Record a stage's current input fingerprints in its run's manifest (after a successful build)."""
+    manifest = read_manifest(stage['run_dir'])
+    manifest[stage['stage']] = {
+        'inputs': dict([[path, fingerprint(path)] for path in stage['inputs']]),
+        'built': dt.datetime.now().isoformat(timespec='seconds')
+    }
+    path = manifest_path(stage['run_dir'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+## ------------------------
+## STAGES
+## ------------------------
+
+def run_stages(run, run_dir, runtype, select_file, nobuild_dir, params_file, optional=()):
+    """Stages for one model run, in build order.
+
+    each stage is a dictionary: run/run_dir/stage names, outputs and inputs (file paths), and the
+    script + args that build it. runtype is 'nobuild', 'link' or 'line'. optional: OPTIONAL_STAGES to include.
+    """
+    db = run_dir + '\\Database'
+    results = db + '\\rsp_evaluation\\results'
+    punch = db + '\\data\\punchlink.csv'
+    scripts = lambda s: [os.path.join(src, f) for f in STAGE_SCRIPTS[s]]
+    selected = [select_file] if select_file else []
+    stages = []
+
+    ## -- geography: Emme export + corridor selection (GetRSPCorridorInfo_SingleProject.bat) -- ##
+    if runtype == 'nobuild':
+        outputs = [db + '\\Select_Link\\scen_70029\\emme_links.shp', db + '\\data\\transitpunch.csv']
+        inputs = [db + '\\emmebank']
+        nb_arg = run_dir
+    elif runtype == 'link':
+        outputs = [db + f'\\Select_Link\\{a}_corridor_70029.csv' for a in ['rsp', 'nb']]
+        inputs = [db + '\\emmebank', nobuild_dir + '\\Database\\Select_Link\\scen_70029\\emme_links.shp']
+        nb_arg = nobuild_dir
+    else:
+        outputs = [db + '\\data\\transitpunch.csv']
+        inputs = [db + '\\emmebank']
+        nb_arg = nobuild_dir
+    stages.append({
+        'run': run, 'run_dir': run_dir, 'stage': 'geography',
+        'outputs': outputs, 'inputs': inputs + selected + scripts('geography'),
+        'script': os.path.join(src, 'GetRSPCorridorInfo_SingleProject.bat'), 'args': [nb_arg, run_dir]
+    })
+
+    ## -- congestion metrics (highway projects and the no-build) -- ##
+    if runtype in ('nobuild', 'link'):
+        inputs = [punch, params_file, results + '\\extra_links_70029.csv']
+        if runtype == 'link':
+            inputs.append(db + '\\rsp_evaluation\\inputs\\geography\\rsp_corridor_70029.csv')
+        stages.append({
+            'run': run, 'run_dir': run_dir, 'stage': 'congestion',
+            'outputs': [results + '\\RSP_congestion_factors.csv', results + '\\RSP_congestion_factors_links.npz'],
+            'inputs': inputs + selected + scripts('congestion'),
+            'script': os.path.join(src, 'congestion_metrics_EDA.py'), 'args': [run_dir, run, params_file]
+        })
+
+    ## -- running emissions -- ##
+    stages.append({
+        'run': run, 'run_dir': run_dir, 'stage': 'emissions',
+        'outputs': [results + '\\emissions.csv'],
+        'inputs': [punch] + RATE_FILES['emissions'] + scripts('emissions'),
+        'script': os.path.join(src, 'rsp_emissions_2.py'), 'args': [run_dir]
+    })
+
+    ## -- no-build baseline for the comparisons (after its congestion links and emissions) -- ##
+    if runtype == 'nobuild':
+        stages.append({
+            'run': run, 'run_dir': run_dir, 'stage': 'baseline',
+            'outputs': [results + '\\nobuild_baseline.npz'],
+            'inputs': [results + '\\RSP_congestion_factors_links.npz', db + '\\data\\transitpunch.csv', results + '\\emissions.csv', params_file] + scripts('baseline'),
+            'script': os.path.join(src, 'nobuild_baseline.py'), 'args': [run_dir, params_file]
+        })
+
+    ## -- benefit-cost analysis (highway projects) -- ##
+    if 'bca' in optional and runtype == 'link':
+        rsp_id = run.split('_')[0]
+        stages.append({
+            'run': run, 'run_dir': run_dir, 'stage': 'bca',
+            'outputs': [results + f'\\{f}.csv' for f in ['hwysummary_out', 'trntsummary_out', 'bcasummary_out', 'bca_statistics']],
+            'inputs': [punch, params_file, db + f'\\Select_Link\\{rsp_id}_proj_links.txt', db + '\\emmebank'] + RATE_FILES['bca'] + scripts('bca'),
+            'script': os.path.join(src, 'BCA_calc_3.py'), 'args': [params_file, run_dir, rsp_id]
+        })
+    return stages
+
+
+def graph(dir, params_file=None, optional=()):
+    """Every stage for a folder of RSP runs, in build order (no-build first -- corridor selection uses its network)."""
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    nobuild, nobuild_dir, rsp_runs_dir = model_runs.find_runs(dir)
+    stages = run_stages(nobuild, nobuild_dir, 'nobuild', None, nobuild_dir, params_file, optional)
+    for run, info in rsp_runs_dir.items():
+        stages += run_stages(run, info[0], info[1], info[2], nobuild_dir, params_file, optional)
+    return stages
+
+
+def compare_stage(dir, output, params_file=None, runs=None):
+    """The comparison table (rsp_measures.py) as a stage: output, and what it's calculated from for the given RSP runs (default all).
+
+    recorded in the no-build's manifest, once per output file -- rsp_pms.py uses it to skip recalculating an unchanged table.
+    """
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    nobuild, nobuild_dir, rsp_runs_dir = model_runs.find_runs(dir)
+    results = lambda run_dir: run_dir + '\\Database\\rsp_evaluation\\results'
+    inputs = [results(nobuild_dir) + '\\nobuild_baseline.npz', params_file]
+    for run, info in rsp_runs_dir.items():
+        if runs is not None and run not in runs:
+            continue
+        run_dir, runtype, select_file = info
+        inputs += [select_file, results(run_dir) + '\\emissions.csv']
+        if runtype == 'link':
+            inputs += [results(run_dir) + '\\RSP_congestion_factors_links.npz', results(run_dir) + '\\extra_links_70029.csv']
+            inputs += [run_dir + f'\\Database\\Select_Link\\{a}_corridor_70029.csv' for a in ['nb', 'rsp']]
+        else:
+            inputs.append(run_dir + '\\Database\\data\\transitpunch.csv')
+    return {
+        'run': nobuild, 'run_dir': nobuild_dir, 'stage': 'compare:' + os.path.abspath(output),
+        'outputs': [output], 'inputs': inputs + [os.path.join(src, f) for f in STAGE_SCRIPTS['compare']],
+        'script': os.path.join(src, 'rsp_pms.py'), 'args': [dir, '--stages', 'compare', '--output', output]
+    }
+
+
+def stale_reason(stage, manifest=None):
+    """Why a stage needs rebuilding, or None if its outputs are current."""
+    missing = [f for f in stage['outputs'] if not os.path.exists(f)]
+    if missing:
+        return 'output missing: ' + ', '.join(os.path.basename(f) for f in missing)
+    if manifest is None:
+        manifest = read_manifest(stage['run_dir'])
+    recorded = manifest.get(stage['stage'])
+    if recorded is None:
+        return 'no build record'
+    changed = [path for path in stage['inputs'] if recorded['inputs'].get(path) != fingerprint(path)]
+    if changed:
+        return 'changed: ' + ', '.join(os.path.basename(f) for f in changed)
+    return None
+
+
+def plan(stages):
+    """[stage, reason] for each stage that needs rebuilding, in build order.
+
+    a stage whose inputs include another stage's outputs is rebuilt after it (and is stale whenever
+    that stage is being rebuilt).
+    """
+    todo = []
+    rebuilt = set()
+    manifests = {}
+    for stage in stages:
+        if stage['run_dir'] not in manifests:
+            manifests[stage['run_dir']] = read_manifest(stage['run_dir'])
+        reason = stale_reason(stage, manifests[stage['run_dir']])
+        upstream = [f for f in stage['inputs'] if f in rebuilt]
+        if reason is None and upstream:
+            reason = 'upstream rebuilt: ' + ', '.join(os.path.basename(f) for f in upstream)
+        if reason is not None:
+            todo.append([stage, reason])
+            rebuilt.update(stage['outputs'])
+    return todo
+
+
+## ------------------------
+## BUILD
+## ------------------------
+
+def clear_outputs(stage):
+    """Remove a stale stage's old outputs, so a failed or skipped rebuild can't leave them looking current."""
+    for f in stage['outputs']:
+        if os.path.exists(f) and not os.path.isdir(f):
+            os.remove(f)
+
+
+def build_stage(stage):
+    """Rebuild one stage in a new process. returns True if it produced all its outputs."""
+    clear_outputs(stage)
+    if stage['script'].endswith('.bat'):
+        command = [stage['script']] + stage['args']
+    else:
+        command = [sys.executable, stage['script']] + stage['args']
+    result = subprocess.run(command)
+    ok = result.returncode == 0 and all(os.path.exists(f) for f in stage['outputs'])
+    if ok:
+        record(stage)
+    return ok
+
+
+def build(stages, dry_run=False, adopt=False):
+    """Rebuild the stages whose inputs changed. returns the [stage, reason] plan that was (or would be) run."""
+    todo = plan(stages)
+    if not todo:
+        print('All outputs are current.')
+    for stage, reason in todo:
+        print(f"{stage['run']:<15} {stage['stage']:<11} {reason}")
+    if dry_run:
+        return todo
+
+    for stage, reason in todo:
+        if adopt:
+            if all(os.path.exists(f) for f in stage['outputs']):
+                record(stage)
+                print(f"  -- {stage['run']} {stage['stage']}: recorded existing outputs as current")
+            continue
+        print(f"Building {stage['stage']} for {stage['run']}...")
+        if not build_stage(stage):
+            raise RuntimeError(f"{stage['stage']} failed for {stage['run']} -- see output above.")
+    return todo
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild RSP evaluation outputs whose inputs changed.')
+    parser.add_argument('dir', help='folder containing the RSP model runs')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be rebuilt')
+    parser.add_argument('--adopt', action='store_true', help='record existing outputs as current without rebuilding')
+    parser.add_argument('--params', default=None, help='bca_parameters.csv (default: the one next to this script)')
+    args = parser.parse_args()
+    build(graph(args.dir, args.params), dry_run=args.dry_run, adopt=args.adopt)
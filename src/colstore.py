@@ -0,0 +1,244 @@
+## COLSTORE.PY
+# Compact binary column files (.npz) standing in for big csv files that get re-read every run
+# Each column is stored as its own typed array, so a reader can pull only the columns it needs,
+# and a small json header records where the data came from (to tell when the copy is stale)
+# ColumnWriter builds a column file a chunk of rows at a time, for tables too big to hold in memory.
+# write_array()/read_array() keep a single big array as a .npy file that is memory-mapped on read.
+#
+# cached_csv() keeps a local copy of csv inputs on slow network drives (M:\ rate tables etc.)
+# in a cache folder on this machine. set RSP_PMS_CACHE to move the cache folder.
+
+import os
+import json
+import contextlib
+import shutil
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+
+META = '__meta__'
+#prefix of the missing-value mask stored for a text column that has missing values
+NULLS = '__nulls__'
+
+#cache folder for cached_csv() -- local disk, not the network drive
+CACHE_DIR = os.environ.get(
+    'RSP_PMS_CACHE',
+    os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'rsp_pms_cache')
+)
+
+#running count of cached_csv() hits/misses for this python session
+CACHE_STATS = {'hit': 0, 'miss': 0}
+
+
+## ------------------------
+## COLUMN FILES
+## ------------------------
+
+@contextlib.contextmanager
+def _replacing(path):
+    """Open a new temporary file next to path for writing, and swap it in for path if the block finishes.
+
+    the temporary file has a unique name, so two processes writing the same path don't write into each other's.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield file
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_columns(df, path, meta=None):
+    """Write a DataFrame to a .npz column file. meta (a json-able dict) is stored alongside."""
+    meta = dict(meta or {})
+    arrays = {}
+    strcols = []
+    nullcols = []
+    for col in df.columns:
+        values = df[col].values
+        if values.dtype == object:
+            #text columns go in as fixed-width unicode so the file never needs pickle to load --
+            #missing values as '' plus a mask, so they come back as NaN rather than 'nan'
+            nulls = pd.isna(values)
+            if nulls.any():
+                values = np.where(nulls, '', values)
+                arrays[NULLS + str(col)] = nulls
+                nullcols.append(str(col))
+            values = values.astype(str)
+            strcols.append(col)
+        arrays[col] = values
+    meta['columns'] = [str(c) for c in df.columns]
+    meta['strcols'] = strcols
+    meta['nullcols'] = nullcols
+    arrays[META] = np.array(json.dumps(meta))
+
+    #write next to the target, then swap in -- a reader never sees half a file
+    with _replacing(path) as file:
+        np.savez(file, **arrays)
+
+
+class ColumnWriter:
+    """Writes a .npz column file (same layout as write_columns()) a chunk of rows at a time.
+
+    each chunk's columns are appended to temporary files next to path, and close() packs them into
+    the .npz -- a column at a time, streamed from disk -- so the whole table is never in memory.
+    dtypes: {column: dtype} every chunk is cast to; other columns get default (None: the first chunk's
+    types). a cast that would change values raises ValueError. the types are recorded in the meta
+    ('dtypes'). compress: deflate the columns in the .npz.
+    use as a context manager -- nothing is written if the block raises.
+    """
+
+    def __init__(self, path, meta=None, dtypes=None, default=None, compress=False):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.dtypes = dict(dtypes or {})
+        self.default = default
+        self.compress = compress
+        self.columns = None
+        self.rows = 0
+        self._dir = tempfile.mkdtemp(prefix='columns_', dir=os.path.dirname(os.path.abspath(path)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, tb):
+        if kind is None:
+            self.close()
+        else:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = [str(c) for c in df.columns]
+            for col in self.columns:
+                if df[col].dtype == object:
+                    raise ValueError(f'ColumnWriter only writes numeric columns ({col} is text).')
+                self.dtypes[col] = np.dtype(self.dtypes.get(col, self.default or df[col].dtype))
+        elif [str(c) for c in df.columns] != self.columns:
+            raise ValueError('every chunk needs the same columns, in the same order.')
+        for i, col in enumerate(self.columns):
+            values = df[col].to_numpy()
+            typed = values.astype(self.dtypes[col], copy=False)
+            if typed.dtype != values.dtype and not np.array_equal(typed, values, equal_nan=values.dtype.kind == 'f' and typed.dtype.kind == 'f'):
+                raise ValueError(f'{col} values don\'t fit its declared type {self.dtypes[col]}.')
+            with open(os.path.join(self._dir, f'{i}.bin'), 'ab') as file:
+                typed.tofile(file)
+        self.rows += len(df)
+
+    def close(self):
+        """Pack the appended columns into the .npz (swapped in whole, like write_columns())."""
+        meta = dict(self.meta, columns=self.columns or [], strcols=[], nullcols=[])
+        meta['dtypes'] = dict([[col, str(self.dtypes[col])] for col in meta['columns']])
+        compression = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        with _replacing(self.path) as out, zipfile.ZipFile(out, 'w', compression=compression, allowZip64=True) as store:
+            for i, col in enumerate(meta['columns']):
+                raw = os.path.join(self._dir, f'{i}.bin')
+                if self.rows:
+                    values = np.memmap(raw, dtype=self.dtypes[col], mode='r', shape=(self.rows,))
+                else:
+                    values = np.zeros(0, dtype=self.dtypes[col])
+                with store.open(col + '.npy', 'w', force_zip64=True) as file:
+                    np.lib.format.write_array(file, values, allow_pickle=False)
+                del values
+            with store.open(META + '.npy', 'w') as file:
+                np.lib.format.write_array(file, np.array(json.dumps(meta)), allow_pickle=False)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def read_meta(path):
+    """The json header of a .npz column file, or None if the file doesn't exist/can't be read."""
+    try:
+        with np.load(path, allow_pickle=False) as store:
+            return json.loads(str(store[META]))
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        #missing, empty, truncated or not a column file
+        return None
+
+
+def read_columns(path, columns=None):
+    """Read a .npz column file back into a DataFrame. only the requested columns are read from disk."""
+    with np.load(path, allow_pickle=False) as store:
+        meta = json.loads(str(store[META]))
+        if columns is None:
+            columns = meta['columns']
+        missing = [c for c in columns if c not in meta['columns']]
+        if missing:
+            raise KeyError(f'{path} has no column(s) {missing}')
+        df = pd.DataFrame({c: store[c] for c in columns}, columns=columns)
+        for col in meta['strcols']:
+            if col in df.columns:
+                df[col] = df[col].astype(object)
+                if col in meta.get('nullcols', ()):
+                    df.loc[store[NULLS + col], col] = np.nan
+    return df
+
+
+def write_array(values, path):
+    """Write one array to a .npy file (swapped in whole, like write_columns())."""
+    with _replacing(path) as file:
+        np.save(file, np.ascontiguousarray(values), allow_pickle=False)
+
+
+def read_array(path):
+    """A .npy file from write_array(), memory-mapped -- only the rows that get indexed are read from disk."""
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+## ------------------------
+## SOURCE FILES
+## ------------------------
+
+def source_key(path):
+    """Identifies one version of a source file: full path, size and modified time."""
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def source_keys(paths):
+    """Meta for a column file built from several source files: {'sources': [source_key() of each, None if it's missing]}."""
+    return {'sources': [source_key(p) if os.path.exists(p) else None for p in paths]}
+
+
+def is_current(path, source):
+    """True if the column file at path was built from the current version of source (a file, or a list of files -- see source_keys())."""
+    meta = read_meta(path)
+    #files from before text columns kept their missing values ('nullcols') may hold 'nan' strings -- rebuilt once
+    if meta is None or 'nullcols' not in meta:
+        return False
+    if isinstance(source, (list, tuple)):
+        return meta.get('sources') == source_keys(source)['sources']
+    key = source_key(source)
+    return all(meta.get(k) == key[k] for k in key)
+
+
+def cached_csv(path, columns=None, cache_dir=None):
+    """pd.read_csv(path), served from a local binary copy when the source hasn't changed.
+
+    the copy is keyed by the source's full path, size and modified time -- if any of those change
+    the csv is re-read and the copy refreshed. prints whether each read was a hit or a miss.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    name = hashlib.sha1(os.path.abspath(path).lower().encode('utf-8')).hexdigest()[:16]
+    cached = os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(path))[0]}_{name}.npz')
+
+    if is_current(cached, path):
+        CACHE_STATS['hit'] += 1
+        print(f'  -- cache hit: {os.path.basename(path)}')
+        return read_columns(cached, columns)
+
+    CACHE_STATS['miss'] += 1
+    print(f'  -- cache miss: {os.path.basename(path)} (reading csv, refreshing local copy)')
+    key = source_key(path)
+    df = pd.read_csv(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_columns(df, cached, meta=key)
+    except OSError as e:
+        #can't write the cache -- not fatal, the next run just reads the csv again
+        print(f'  -- could not write cache file {cached}: {e}')
+    return df[columns] if columns is not None else df
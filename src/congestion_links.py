@@ -0,0 +1,66 @@
+## CONGESTION_LINKS.PY
+# A run's congestion links table -- every 7-county punchlink link with the congestion, K+A and EDA measures
+# congestion_metrics_EDA.py calculates for it -- saved as a compressed column file (colstore.py):
+# Database\rsp_evaluation\results\RSP_congestion_factors_links.npz. Columns are stored in a declared
+# schema (SCHEMA) and readers (rsp_measures.py, monte_carlo.py) load only the columns they use.
+# RSP_congestion_factors_links.csv is an optional export, for looking at the links in other tools:
+# congestion_metrics_EDA.py --csv writes it alongside the .npz, and this script writes it from an existing .npz.
+#
+# usage: python congestion_links.py <cmap_trip-based_model folder> [...]
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import colstore
+import punchlink
+
+#column types: punchlink's compact types (zone numbers in int32, room for finer zone systems) and
+#link_metrics.py's time period hours; every other column is float64
+SCHEMA = dict(punchlink.DTYPES, zone=np.int32, hours=np.int8)
+
+
+def paths(run):
+    """(RSP_congestion_factors_links.npz, RSP_congestion_factors_links.csv) for a 'cmap_trip-based_model' run folder."""
+    results = run + '\\Database\\rsp_evaluation\\results'
+    return results + '\\RSP_congestion_factors_links.npz', results + '\\RSP_congestion_factors_links.csv'
+
+
+def exists(run):
+    """True if the run has a congestion links table (the .npz, or a csv from before it was saved that way)."""
+    return any(os.path.exists(p) for p in paths(run))
+
+
+def writer(run):
+    """colstore.ColumnWriter for a run's links table, in SCHEMA types -- append() it the links a chunk at a time."""
+    return colstore.ColumnWriter(paths(run)[0], dtypes=SCHEMA, default=np.float64, compress=True)
+
+
+def write(links, run):
+    """Save a run's whole links table."""
+    with writer(run) as w:
+        w.append(links)
+
+
+def read(run, columns=None):
+    """A run's links table, just the given columns (all of them if None)."""
+    npz, csv = paths(run)
+    if os.path.exists(npz):
+        return colstore.read_columns(npz, columns)
+    #run from before the table was saved as a column file
+    links = punchlink.compact(pd.read_csv(csv, usecols=columns))
+    return links if columns is None else links[columns]
+
+
+def export_csv(run, chunksize=500000):
+    """Write RSP_congestion_factors_links.csv from the .npz, a chunk of rows at a time."""
+    npz, csv = paths(run)
+    links = colstore.read_columns(npz)
+    for start in range(0, max(len(links), 1), chunksize):
+        links.iloc[start:start+chunksize].to_csv(csv, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    return csv
+
+
+if __name__ == '__main__':
+    for run in sys.argv[1:]:
+        print(f'Exported {export_csv(run)}')
@@ -1,25 +1,20 @@
 ## CONGESTION_METRICS_EDA.PY
 # Script calculates measures on an RSP project links, corridor links, and regionwide
 # Uses punchlink.csv and extra_links_70029.csv to get info on congestion and EDA usage
-
-print('Starting "congestion_metrics_EDA.py"...')
+# The work is in congestion() -- rsp_pms.py runs it in-process; running this file runs it for one model run.
+#
+# usage: python congestion_metrics_EDA.py <cmap_trip-based_model folder> <run name> [<bca_parameters.csv>] [--chunksize <rows>] [--csv]
+# --chunksize streams punchlink that many rows at a time (see STREAMING below) -- memory stays flat however big the network is
+# the links are saved as RSP_congestion_factors_links.npz (congestion_links.py); --csv also exports them as a csv
 
 #IMPORT LIBRARIES
 import os, sys
 import pandas as pd, numpy as np
-import datetime as dt
-import csv 
-
-## ------------------------
-## INPUTS
-## ------------------------
-dir = sys.argv[1] + '\\Database'    # -- model run location
-rsp_id = sys.argv[2]                # -- run name
-
-# EDA volumes on links
-eda_link_vol_file = dir+'\\rsp_evaluation\\results\\extra_links_70029.csv'
-# punch file for VMT/VHT calcs
-punch = dir + '\\data\\punchlink.csv'
+import link_metrics
+import link_keys
+import levels
+import congestion_links
+import model_runs
 
 
 ## --------------------
@@ -27,7 +22,7 @@ punch = dir + '\\data\\punchlink.csv'
 ## --------------------
 
 # This script uses the params dictionary to pull parameters from bca_parameters.csv
-# The following parameters are pulled from bca_parameters.csv: 
+# The following parameters are pulled from bca_parameters.csv:
 #   - volume/capacity threshold that defines 'congested': params['vc_threshold']
 #   - 5-year Interstate K+A rate: params['SAFE_ikarate']
 #   - 5-year Non-Interstate K+A Rate: params['SAFE_nikarate']
@@ -35,210 +30,203 @@ punch = dir + '\\data\\punchlink.csv'
 #
 # For more info, see bca_parameters.csv (File contains descriptions of each parameter.)
 
-#bring in parameters file as a dictionary
-params={}
-with open(os.getcwd()+'\\bca_parameters.csv', 'r') as file:
-    csvreader = csv.reader(file)
-    next(csvreader) #skip first row of headers
-    for row in csvreader:
-        params[row[0]] = float(row[1]) #first entry (row[0]) is parameter name, second (row[1]) is value
-
-
 #z17 zones for 7 counties (maximum zone value)
 z17 = 2926
 
 
 ## ----------------
-## OUTPUTS 
+## LINKS
 ## ----------------
 
-out_dir = dir + '\\rsp_evaluation\\results'
+#link measures summed for each analysis level and time period
+SUM_COLS = [
+    'AllVMT', 'CongestedVMT', 'AllVHT', 'CongestedVHT', 'HTruckVMT', 'CongestedHTruckVMT',
+    'HTruckVHT', 'CongestedHTruckVHT', 'annual_ka', 'len', 'lanemi'
+]
+#(analysis level, link flag) -- project and corridor levels only for RSP runs
+LEVELS = [['project', 'projlink'], ['corridor', 'corrlink'], ['7-county region', None]]
+
+
+def run_levels(rsp_id):
+    """LEVELS for a run -- just the region for the no-build ('RSP00')."""
+    return LEVELS[2:] if 'RSP00' in rsp_id else LEVELS
+
+
+def read_inputs(model_dir, rsp_id, params):
+    """What link_rows() needs besides punchlink: params, project/corridor link keys (RSP runs) and EDA link volumes."""
+    db = model_dir + '\\Database'
+    inputs = {'rsp_id': rsp_id, 'params': params}
+    if 'RSP00' not in rsp_id:
+        #project links
+        projlinks = os.path.join(db+'\\Select_Link\\'+os.listdir(db+'\\Select_Link')[0])
+        inputs['projlinks'] = link_keys.read_select_links(projlinks)
+        #corridor links
+        inputs['corrlinks'] = link_keys.read_corridor(db+'\\rsp_evaluation\\inputs\\geography\\rsp_corridor_70029.csv')
+
+    #given EDA link volume csv has been generated
+    eda_link_vol = pd.read_csv(db+'\\rsp_evaluation\\results\\extra_links_70029.csv')
+
+    #cleanup column names
+    cols = eda_link_vol.columns.tolist()
+    colmap = {}
+    for c in cols:
+        d = c.replace(' ', '')
+        d = d.replace('@', '')
+        colmap[c] = d
+    eda_link_vol.rename(columns=colmap, inplace=True)
+    inputs['eda_link_vol'] = eda_link_vol
+    inputs['eda_index'] = link_keys.LinkIndex(link_keys.keys(eda_link_vol))
+    return inputs
+
+
+def link_rows(df, inputs):
+    """Congestion, K+A and EDA measures for punchlink rows (with link metrics) -- the rows of the links output."""
+    params = inputs['params']
+    if 'RSP00' not in inputs['rsp_id']: ## 'RSP00' is no-build scenario-- other rsp's will incorporate project and corridor results
+        #project and corridor links (1 or null)
+        df_keys = link_keys.keys(df)
+        df['projlink'] = np.where(link_keys.isin(df_keys, inputs['projlinks']), 1, np.nan)
+        df['corrlink'] = np.where(link_keys.isin(df_keys, inputs['corrlinks']), 1, np.nan)
+
+    ## -- Create necessary variables -- ##
+    links = df[(df['zone'] > 0) & (df['zone'] <= z17)].copy()                          ##-- limit to 7 counties
+    links['hTruck'] = links['htruck'] + links['htrucklh']       ##-- short- and long-haul heavy trucks, in vehicles
+    links['congested'] = link_metrics.congested(links, params['vc_threshold'])
+
+    ## -- Link Performance Metrics -- ##
+    links['AllVMT'] = links['all_vmt']
+    links.eval('CongestedVMT = AllVMT * congested', inplace=True)
+    links['AllVHT'] = links['all_vht']      ##-- uses adjusted arterial speeds
+    links.eval('CongestedVHT = AllVHT * congested', inplace=True)
+    links.eval('HTruckVMT = hTruck * len', inplace=True)
+    links.eval('CongestedHTruckVMT = HTruckVMT * congested', inplace=True)
+    links['HTruckVHT'] = np.where((links['mph'] > 0), links['HTruckVMT']/links['mph'], 0)  ##-- use adjusted arterial speeds
+    links.eval('CongestedHTruckVHT = HTruckVHT * congested', inplace=True)
+
+    ## -- Link PMs K+A -- ##
+    #non-interstate rate
+    links['annual_ka'] = links['AllVMT'] * params['ann_factor'] * params['SAFE_nikarate'] / 100000000
+    #interstate rate
+    links.loc[links['vdf'].isin([2,3,4,5,8]), 'annual_ka'] = links['AllVMT'] * params['ann_factor'] * params['SAFE_ikarate'] / 100000000
+
+    ## ----------- EDA VMT -----------------
+    #look up EDA volumes for links
+    eda_link_vol = inputs['eda_link_vol']
+    links_keys = link_keys.keys(links)
+    for c in eda_link_vol.columns.drop(['inode', 'jnode']):
+        links[c] = inputs['eda_index'].lookup(links_keys, eda_link_vol[c].to_numpy())
+    #calculate eda vmt
+    links['edavmt'] = links['ejvol'] * links['len']
+    #speeds keep the names this output has always had
+    return links.rename(columns={'fmph': 'freeMPH', 'mph': 'MPH'})
+
+
+def level_sums(links, analysis_levels):
+    """{analysis level: (SUM_COLS summed by timeperiod, daily edavmt)} for link rows -- every level in one pass (levels.py)."""
+    masks = dict([[level, np.ones(len(links), dtype=bool) if flag is None else (links[flag]==1).to_numpy()] for level, flag in analysis_levels])
+    groups = levels.LevelGroups(links['timeperiod'].to_numpy(), masks)
+    by_tp = groups.frames(links[SUM_COLS + ['edavmt']])
+    sums = {}
+    for level in masks:
+        edavmt = by_tp[level].loc[by_tp[level].index==1, 'edavmt'].sum()      #timeperiod==1 b/c edavmt is a daily value
+        sums[level] = (by_tp[level][SUM_COLS], edavmt)
+    return sums
+
+
+def summarize(by_tp, edavmt, level):
+    """Summary rows for an analysis level: a row per time period plus a 'Total' row."""
+    result = by_tp.reset_index()
+        #make summary column
+    tot = result.agg(dict([[c, 'average' if c in ['len', 'lanemi'] else 'sum'] for c in SUM_COLS]))
+    tot['timeperiod'] = 'Total'
+    result = pd.concat([result, tot.to_frame().T], ignore_index=True, sort=True)
+    result.loc[result['timeperiod']=='Total', 'edavmt'] = edavmt
+    result['analysis_level'] = level
+    return result
 
 
 ## ----------------
-## EXECUTE 
+## EXECUTE
 ## ----------------
 
-print('Grabbing punchlink file and performing congestion calculations...')
-## -- Read in punch link files -- ##
-df = pd.read_csv(punch)
-df.rename(columns={'i_node':'inode', 'j_node':'jnode'}, inplace=True)
-
-
-if 'RSP00' not in rsp_id: ## 'RSP00' is no-build scenario-- other rsp's will incorporate project and corridor results
-
-    clink_csv = dir + '\\rsp_evaluation\\inputs\\geography\\'
-
-    #create project links dataframe
-    projlinks = os.path.join(dir+'\\Select_Link\\'+os.listdir(dir+'\\Select_Link')[0])
-    projlinks = pd.read_csv(projlinks, skiprows=1, names=['inode','jnode'])
-    projlinks['inode'] = projlinks['inode'].str.replace("l=", "").astype(int)
-    projlinks['jnode'] = projlinks['jnode'].astype(int)
-    projlinks['projlink'] = 1
-
-    # --
-
-    #create corridor links dataframe
-    corrlinks = dir+'\\rsp_evaluation\\inputs\\geography\\rsp_corridor_70029.csv'
-    corrlinks = pd.read_csv(corrlinks)
-    corrlinks = corrlinks[['INODE', 'JNODE']].copy()
-    corrlinks.rename(columns={'INODE':'inode','JNODE':'jnode'}, inplace=True)
-    corrlinks['corrlink'] = 1
-
-
-    df = pd.merge(df, projlinks, how='left', on=['inode', 'jnode'])
-    df = pd.merge(df, corrlinks, how='left', on=['inode', 'jnode'])
-
-
-## -- Create necessary variables -- ##
-links = df[(df['zone'] > 0) & (df['zone'] <= z17)].copy()                          ##-- limit to 7 counties
-##--- volume in VEQs for v/c ratio ---
-links.eval('volau = avauv + avh2v + avh3v + avbqv + avlqv + avmqv + avhqv + busveq', inplace=True)
-##--- volume in Vehicles ---
-links.eval('vehicles = avauv + avh2v + avh3v + avbqv + avlqv + avmqv/2 + avhqv/3 + busveq/3', inplace=True)
-links['hTruck'] = links['avhqv']/3
-
-
-    # ----- Calculate link VMT and VHT ------
-
-## -- Link capacity calculations -- ##
-links['hours'] = 2
-links.loc[links['timeperiod'] == 1, 'hours'] = 5
-links.loc[(links['timeperiod'] == 2) | (links['timeperiod'] == 4), 'hours'] = 1
-links.loc[links['timeperiod'] == 5, 'hours'] = 4
-links.eval('capacity = lan * emcap * hours', inplace=True)
-
-## -- Arterial Speed Adjustment due to LOS C used in VDF -- ##
-links['freeMPH'] = np.where((links['ftime'] > 0), (links['len']/(links['ftime']/60)), 20)  
-links['MPH'] = 0
-links.loc[links['timau'] > 0, 'MPH'] = links['len'] / (links['timau']/60)
-links.loc[links['vdf'] == 1, 'MPH'] = links['freeMPH'] * (1/((np.log(links['freeMPH']) * 0.249) + 0.153 * (links['volau'] / (links['capacity']*0.75))**3.98))
-links['congested'] = 0
-links.loc[(links['capacity'] > 0) & (links['volau'] / links['capacity'] >= params['vc_threshold']), 'congested'] = 1
-
-## -- Link Performance Metrics -- ##
-links.eval('AllVMT = vehicles * len', inplace=True)
-links.eval('CongestedVMT = AllVMT * congested', inplace=True)   
-links['AllVHT'] = np.where((links['MPH'] > 0), (links['AllVMT']/links['MPH']), 0)  ##-- use adjusted arterial speeds
-links.eval('CongestedVHT = AllVHT * congested', inplace=True)
-links.eval('HTruckVMT = hTruck * len', inplace=True)
-links.eval('CongestedHTruckVMT = HTruckVMT * congested', inplace=True)
-links['HTruckVHT'] = np.where((links['MPH'] > 0), links['HTruckVMT']/links['MPH'], 0)  ##-- use adjusted arterial speeds
-links.eval('CongestedHTruckVHT = HTruckVHT * congested', inplace=True)
-
-## -- Link PMs K+A -- ##
-#non-interstate rate
-links['annual_ka'] = links['AllVMT'] * params['ann_factor'] * params['SAFE_nikarate'] / 100000000
-#interstate rate
-links.loc[links['vdf'].isin([2,3,4,5,8]), 'annual_ka'] = links['AllVMT'] * params['ann_factor'] * params['SAFE_ikarate'] / 100000000
-
-# lane miles
-links['lanemi'] = links['lan'] * links['len']
-
-## commented out for now-- don't know how to generate this
-
-## ----------- Calculate EDA VMT -----------------
-#given EDA link volume csv has been generated
-eda_link_vol = pd.read_csv(eda_link_vol_file)
-
-#cleanup column names
-cols = eda_link_vol.columns.tolist()
-colmap = {}
-for c in cols:
-    d = c.replace(' ', '')
-    d = d.replace('@', '')
-    colmap[c] = d
-eda_link_vol.rename(columns=colmap, inplace=True)
-#merge values to links
-links = pd.merge(links, eda_link_vol, how='left', on=['inode', 'jnode'])
-#calculate eda vmt
-links['edavmt'] = links['ejvol'] * links['len']
-
-
-## --------- Summarize By Project, Corridor, Region, Time of Day -----------------
-if 'RSP00' not in rsp_id:
-    print('Calculating project-specific and corridor-specific congestion metrics...')
-    # project link measures
-    projlinks = links.loc[links['projlink']==1]
-    projlinks_result = projlinks.groupby('timeperiod').agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                                                    'AllVHT':'sum', 'CongestedVHT':'sum',
-                                                    'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                                                    'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                                                    'annual_ka':'sum', 'len':'sum', 'lanemi':'sum'
-                                                    })
-    projlinks_result.reset_index(inplace=True)
-        #make summary column
-    tot = projlinks_result.agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                            'AllVHT':'sum', 'CongestedVHT':'sum',
-                            'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                            'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                            'annual_ka':'sum', 'len':'average', 'lanemi':'average'})
-    tot['timeperiod'] = 'Total'
-    projlinks_result = pd.concat([projlinks_result, tot.to_frame().T], ignore_index=True, sort=True)
-    edavmt = projlinks.loc[projlinks['timeperiod']==1, 'edavmt'].sum()      #timeperiod==1 b/c edavmt is a daily value
-    projlinks_result.loc[projlinks_result['timeperiod']=='Total', 'edavmt'] = edavmt
-    projlinks_result['analysis_level'] = 'project'
-
-    #--
-
-    # corridor link measures
-    clinks = links.loc[links['corrlink']==1]
-    clinks_result = clinks.groupby('timeperiod').agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                                                    'AllVHT':'sum', 'CongestedVHT':'sum',
-                                                    'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                                                    'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                                                    'annual_ka':'sum', 'len':'sum', 'lanemi':'sum',
-                                                    })
-    clinks_result.reset_index(inplace=True)
-        #make summary column
-    tot = clinks_result.agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                            'AllVHT':'sum', 'CongestedVHT':'sum',
-                            'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                            'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                            'annual_ka':'sum', 'len':'average', 'lanemi':'average'})
-    tot['timeperiod'] = 'Total'
-    clinks_result = pd.concat([clinks_result, tot.to_frame().T], ignore_index=True, sort=True)
-    edavmt = clinks.loc[clinks['timeperiod']==1, 'edavmt'].sum()      #timeperiod==1 b/c edavmt is a daily value
-    clinks_result.loc[clinks_result['timeperiod']=='Total', 'edavmt'] = edavmt
-    clinks_result['analysis_level'] = 'corridor'
-
-#--
-print('Summarizing data...')
-#7-county measures
-region_result = links.groupby('timeperiod').agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                                                 'AllVHT':'sum', 'CongestedVHT':'sum',
-                                                 'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                                                 'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                                                 'annual_ka':'sum', 'len':'sum', 'lanemi':'sum',
-                                                 })
-region_result.reset_index(inplace=True)
-    #make summary column
-tot = region_result.agg({'AllVMT':'sum', 'CongestedVMT':'sum',
-                         'AllVHT':'sum', 'CongestedVHT':'sum',
-                         'HTruckVMT':'sum', 'CongestedHTruckVMT':'sum',
-                         'HTruckVHT':'sum', 'CongestedHTruckVHT':'sum',
-                         'annual_ka':'sum', 'len':'average', 'lanemi':'average'})
-tot['timeperiod'] = 'Total'
-region_result = pd.concat([region_result, tot.to_frame().T], ignore_index=True, sort=True)
-edavmt = links.loc[links['timeperiod']==1, 'edavmt'].sum()      #timeperiod==1 b/c edavmt is a daily value
-region_result.loc[region_result['timeperiod']=='Total', 'edavmt'] = edavmt
-region_result['analysis_level'] = '7-county region'
-
-
-## ------ Create Final Table, and Export -------
-
-if 'RSP00' not in rsp_id:
-    final = pd.concat([projlinks_result, clinks_result, region_result], ignore_index=True, sort=True)
-    final.loc[final['timeperiod']=='Total', 'edavmtshare'] = final['edavmt'] / final['AllVMT']
-    columnlist = final.columns.tolist()
-    reorderedcolumns = columnlist[:-2]+columnlist[-1:]+columnlist[-2:-1]
-    final = final.reindex(columns=reorderedcolumns)
-    # today = dt.date.today().strftime('%Y-%m-%d')
-
-if 'RSP00' in rsp_id:
-    final = region_result
-
-print('Exporting...')
-final.to_csv(out_dir+f'\\RSP_congestion_factors.csv', index=False)
-links.to_csv(out_dir+f'\\RSP_congestion_factors_links.csv', index=False)
-print(f'Done! Exported files to {out_dir}, named "congestion_factors.csv" and "congestion_factors_links.csv"!')
\ No newline at end of file
+def congestion(model_dir, rsp_id, params_file, chunksize=None, export_csv=False):
+    """RSP_congestion_factors.csv and the links table (congestion_links.py) for one model run.
+
+    model_dir: 'cmap_trip-based_model' folder. rsp_id: run name. chunksize: rows per punchlink chunk
+    (None: read it all at once). export_csv: also write RSP_congestion_factors_links.csv.
+    """
+    print('Starting "congestion_metrics_EDA.py"...')
+    out_dir = model_dir + '\\Database\\rsp_evaluation\\results'
+    inputs = read_inputs(model_dir, rsp_id, model_runs.read_parameters(params_file))
+    analysis_levels = run_levels(rsp_id)
+
+    # punch file for VMT/VHT calcs, with the shared link metrics (see link_metrics.py)
+    punch = model_dir
+    links_out = congestion_links.paths(punch)[1]
+    if chunksize is None:
+        print('Grabbing punchlink file and performing congestion calculations...')
+        ## -- Read in punch link files, with volumes/capacity/speeds/VMT/VHT already calculated (see link_metrics.py) -- ##
+        links = link_rows(link_metrics.read_link_metrics(punch), inputs)
+        sums = level_sums(links, analysis_levels)
+        congestion_links.write(links, punch)
+        if export_csv:
+            links.to_csv(links_out, index=False)
+    else:
+        ## -- STREAMING -- ##
+        #punchlink chunk by chunk: link metrics are calculated for each chunk, its rows are appended to the
+        #links output, and its sums are added to running sums by analysis level and time period
+        print(f'Streaming punchlink file ({chunksize:,} rows at a time) and performing congestion calculations...')
+        sums = None
+        with congestion_links.writer(punch) as links_file:
+            for n, chunk in enumerate(link_metrics.read_chunks(punch, chunksize)):
+                links = link_rows(chunk, inputs)
+                links_file.append(links)
+                if export_csv:
+                    links.to_csv(links_out, index=False, mode='w' if n == 0 else 'a', header=n == 0)
+                part = level_sums(links, analysis_levels)
+                if sums is None:
+                    sums = part
+                else:
+                    sums = dict([[level, (sums[level][0].add(part[level][0], fill_value=0), sums[level][1] + part[level][1])] for level in sums])
+                del links
+
+
+    ## --------- Summarize By Project, Corridor, Region, Time of Day -----------------
+    print('Summarizing data...')
+    results = [summarize(sums[level][0], sums[level][1], level) for level, flag in analysis_levels]
+
+
+    ## ------ Create Final Table, and Export -------
+
+    if 'RSP00' not in rsp_id:
+        final = pd.concat(results, ignore_index=True, sort=True)
+        final.loc[final['timeperiod']=='Total', 'edavmtshare'] = final['edavmt'] / final['AllVMT']
+        columnlist = final.columns.tolist()
+        reorderedcolumns = columnlist[:-2]+columnlist[-1:]+columnlist[-2:-1]
+        final = final.reindex(columns=reorderedcolumns)
+
+    if 'RSP00' in rsp_id:
+        final = results[0]
+
+    print('Exporting...')
+    final.to_csv(out_dir+f'\\RSP_congestion_factors.csv', index=False)
+    print(f'Done! Exported files to {out_dir}, named "congestion_factors.csv" and "congestion_factors_links.npz"' + (' (and .csv)!' if export_csv else '!'))
+
+
+if __name__ == '__main__':
+    ## ------------------------
+    ## INPUTS
+    ## ------------------------
+    args = sys.argv[1:]
+    chunksize = None                    # -- rows per punchlink chunk (None: read it all at once)
+    if '--chunksize' in args:
+        i = args.index('--chunksize')
+        chunksize = int(args[i+1])
+        del args[i:i+2]
+    export_csv = '--csv' in args        # -- also write RSP_congestion_factors_links.csv
+    if export_csv:
+        args.remove('--csv')
+
+    #bring in parameters file as a dictionary (optional 3rd argument, otherwise bca_parameters.csv in the working folder)
+    params_file = args[2] if len(args) > 2 else os.getcwd()+'\\bca_parameters.csv'
+    congestion(args[0], args[1], params_file, chunksize=chunksize, export_csv=export_csv)
@@ -0,0 +1,177 @@
+## CORRIDOR.PY
+# Corridor link selection without ArcGIS: finds the network links within N miles of an RSP's project links
+# (what SelectLayerByLocation WITHIN_A_DISTANCE did in select_by_location.py) using a bulk-loaded
+# STRtree of the network links. Needs shapely (2.0+) and pyshp.
+# The link shapefile's line part boxes and vertices are saved next to it once (NetworkIndex), so the
+# no-build network every highway RSP is compared against is only read from the shapefile once, and a
+# query only reads the vertices of the links near the project.
+# Link shapefiles are the Emme exports from export_geog.py, in NAD 27 State Plane Illinois East (feet).
+#
+# usage: python corridor.py <network emme_links.shp> <project emme_links.shp> <output csv> [miles]
+
+import os
+import sys
+import csv
+import time
+import numpy as np
+import pandas as pd
+import shapefile
+import shapely
+import colstore
+
+#model network coordinates are in feet
+FEET_PER_MILE = 5280
+
+
+def read_points(shp):
+    """Vertices of every link in a shapefile: a row per point with its line part, link (shapefile row) and x/y."""
+    xy, part, link = [], [], []
+    p = 0
+    with shapefile.Reader(shp) as reader:
+        for i, shape in enumerate(reader.iterShapes()):
+            parts = list(shape.parts) + [len(shape.points)]
+            for a, b in zip(parts[:-1], parts[1:]):
+                if b - a < 2:
+                    continue
+                xy += shape.points[a:b]
+                part += [p] * (b - a)
+                link += [i] * (b - a)
+                p += 1
+    xy = np.array(xy, dtype=float).reshape(-1, 2) if xy else np.empty((0, 2))
+    return pd.DataFrame({
+        'part': np.array(part, dtype=np.int32), 'link': np.array(link, dtype=np.int32),
+        'x': xy[:, 0], 'y': xy[:, 1]
+    })
+
+
+def lines(points):
+    """One linestring per line part of read_points() rows (parts numbered from 0, in order)."""
+    if len(points) == 0:
+        return np.array([], dtype=object)
+    return shapely.linestrings(points[['x', 'y']].to_numpy(), indices=points['part'].to_numpy())
+
+
+## ------------------------
+## NETWORK INDEX
+## ------------------------
+
+class NetworkIndex:
+    """Spatial index of a link shapefile, saved next to it and reused by every query.
+
+    <name>_index.npz has a row per line part: its bounding box, link (shapefile row) and where its
+    vertices start/end in <name>_vertices.npy. loading the index reads just those rows and bulk-loads
+    an STRtree of the part boxes; the vertices are memory-mapped, not read. a query looks up the parts
+    whose boxes come within the search distance of the project links in the tree, then reads and builds
+    geometry for those parts only -- its cost depends on the project, not the size of the network.
+    """
+
+    def __init__(self, shp):
+        self.shp = shp
+        self.path = os.path.splitext(shp)[0] + '_index.npz'
+        self.vertices_path = os.path.splitext(shp)[0] + '_vertices.npy'
+        self._parts = None
+
+    def build(self):
+        """(Re)write the saved index from the shapefile. returns (parts, vertices)."""
+        print(f'  -- indexing {self.shp}...')
+        self._parts = self._vertices = None     #let go of a memory-mapped copy before replacing it
+        points = read_points(self.shp)
+        part = points['part'].to_numpy()
+        x, y = points['x'].to_numpy(), points['y'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, np.diff(part) != 0]) if len(points) else np.array([], dtype=np.int64)
+        ends = np.r_[starts[1:], len(points)].astype(np.int64)
+        parts = pd.DataFrame({
+            'link': points['link'].to_numpy()[starts], 'start': starts.astype(np.int64), 'end': ends,
+            'xmin': np.minimum.reduceat(x, starts) if len(starts) else np.empty(0),
+            'ymin': np.minimum.reduceat(y, starts) if len(starts) else np.empty(0),
+            'xmax': np.maximum.reduceat(x, starts) if len(starts) else np.empty(0),
+            'ymax': np.maximum.reduceat(y, starts) if len(starts) else np.empty(0)
+        })
+        vertices = points[['x', 'y']].to_numpy()
+        #vertices first -- the index is what says the pair is current
+        colstore.write_array(vertices, self.vertices_path)
+        colstore.write_columns(parts, self.path, meta=dict(colstore.source_key(self.shp), vertices=len(vertices)))
+        return parts, vertices
+
+    def _load(self):
+        if self._parts is None:
+            #current if built from this version of the shapefile, with the vertices file it was built with
+            meta = colstore.read_meta(self.path) or {}
+            vertices = colstore.read_array(self.vertices_path) if os.path.exists(self.vertices_path) else None
+            if 'vertices' in meta and vertices is not None and len(vertices) == meta['vertices'] and colstore.is_current(self.path, self.shp):
+                parts = colstore.read_columns(self.path)
+            else:
+                vertices = None     #let go of the memory-mapped file before build() replaces it
+                parts, vertices = self.build()
+            self._link = parts['link'].to_numpy()
+            self._start = parts['start'].to_numpy()
+            self._end = parts['end'].to_numpy()
+            self._tree = shapely.STRtree(shapely.box(*parts[['xmin', 'ymin', 'xmax', 'ymax']].to_numpy().T))
+            self._vertices = vertices
+            self._parts = parts
+        return self._parts
+
+    def within(self, project_geoms, miles=5):
+        """Sorted shapefile rows of links within miles of any of project_geoms."""
+        parts = self._load()
+        project_geoms = [g for g in project_geoms if g is not None and not g.is_empty]
+        if not project_geoms or len(parts) == 0:
+            return np.array([], dtype=int)
+        distance = miles * FEET_PER_MILE
+
+        #line parts whose bounding box comes within the distance of a project link's box (tree query on boxes only)
+        boxes = shapely.bounds(np.array(project_geoms, dtype=object))
+        search = shapely.box(boxes[:, 0] - distance, boxes[:, 1] - distance, boxes[:, 2] + distance, boxes[:, 3] + distance)
+        candidates = np.unique(self._tree.query(search)[1])
+        if len(candidates) == 0:
+            return np.array([], dtype=int)
+
+        #vertices of the candidate parts only, then exact distances
+        counts = self._end[candidates] - self._start[candidates]
+        offsets = np.repeat(self._start[candidates] - np.r_[0, np.cumsum(counts)[:-1]], counts)
+        rows = np.arange(counts.sum()) + offsets
+        candidate_lines = shapely.linestrings(np.asarray(self._vertices[rows]), indices=np.repeat(np.arange(len(candidates)), counts))
+        tree = shapely.STRtree(candidate_lines)
+        _, hits = tree.query(project_geoms, predicate='dwithin', distance=distance)
+        return np.unique(self._link[candidates[hits]])
+
+
+#indexes already loaded in this python session, by shapefile
+_INDEXES = {}
+
+
+def network_index(shp):
+    """The NetworkIndex for a link shapefile -- loaded (or built) once per session, on its first query."""
+    key = os.path.abspath(shp)
+    if key not in _INDEXES:
+        _INDEXES[key] = NetworkIndex(shp)
+    return _INDEXES[key]
+
+
+def read_records(shp, rows=None):
+    """Attribute table of a shapefile, or just the given rows of it. returns (field names, records)."""
+    with shapefile.Reader(shp) as reader:
+        fields = [f[0] for f in reader.fields[1:]]  #first field is the deletion flag
+        if rows is None:
+            records = [list(r) for r in reader.records()]
+        else:
+            records = [list(reader.record(int(i))) for i in rows]
+    return fields, records
+
+
+def select_corridor(links_shp, project_shp, out_csv, miles=5):
+    """Write the attribute rows (INODE, JNODE, ...) of links_shp links within miles of project_shp links to out_csv."""
+    selected = network_index(links_shp).within(lines(read_points(project_shp)), miles)
+    fields, records = read_records(links_shp, selected)
+    with open(out_csv, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        writer.writerows(records)
+    return len(selected)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    miles = float(sys.argv[4]) if len(sys.argv) > 4 else 5
+    n = select_corridor(sys.argv[1], sys.argv[2], sys.argv[3], miles)
+    print(f'{n:,} links within {miles:g} miles in {time.perf_counter() - start:.3f} s')
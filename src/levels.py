@@ -0,0 +1,56 @@
+## LEVELS.PY
+# Link sums for several analysis levels (project, corridor, region...) and time periods in a single pass
+# Used by congestion_metrics_EDA.py and BCA_calc_3.py for their summary tables. Levels are boolean masks
+# over the links and can overlap -- project links are also corridor and region links. Each link gets a
+# membership pattern (a bit per level it belongs to) and is summed once into its (pattern, time period)
+# group; a level's sums are the sum of the few groups whose pattern includes it.
+
+import numpy as np
+import pandas as pd
+
+
+class LevelGroups:
+    """Links grouped by level membership and time period, for any number of sums() of link values."""
+
+    def __init__(self, timeperiod, masks):
+        """timeperiod: each link's time period. masks: {level: boolean array over the links}, in output order."""
+        self.levels = list(masks)
+        if len(self.levels) > 16:
+            raise ValueError('LevelGroups handles up to 16 levels.')
+        self.periods, period = np.unique(np.asarray(timeperiod), return_inverse=True)
+        pattern = np.zeros(len(period), dtype=np.int64)
+        for i, level in enumerate(self.levels):
+            pattern |= np.asarray(masks[level], dtype=bool).astype(np.int64) << i
+        self.npatterns = 1 << len(self.levels)
+        self.group = pattern * len(self.periods) + period
+        #which patterns include each level
+        patterns = np.arange(self.npatterns)
+        self._members = dict([[level, ((patterns >> i) & 1) == 1] for i, level in enumerate(self.levels)])
+        self._counts = self._by_group(np.ones((len(self.group), 1)))[..., 0]
+
+    def _by_group(self, values):
+        n = self.npatterns * len(self.periods)
+        sums = [np.bincount(self.group, weights=values[:, j], minlength=n) for j in range(values.shape[1])]
+        return np.array(sums).T.reshape(self.npatterns, len(self.periods), values.shape[1])
+
+    def counts(self):
+        """{level: number of links in each time period}."""
+        return dict([[level, self._counts[self._members[level]].sum(axis=0)] for level in self.levels])
+
+    def sums(self, values):
+        """{level: (time periods x columns) sums of values (links x columns)}. nulls count as 0, like pandas sums."""
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+        values = np.where(np.isnan(values), 0, values)
+        by_group = self._by_group(values)
+        return dict([[level, by_group[self._members[level]].sum(axis=0)] for level in self.levels])
+
+    def frames(self, df):
+        """{level: frame of sums by time period} for a frame's columns -- time periods the level has no links in are left out."""
+        sums = self.sums(df.to_numpy(dtype=float))
+        counts = self.counts()
+        index = pd.Index(self.periods, name='timeperiod')
+        return dict([
+            [level, pd.DataFrame(sums[level], index=index, columns=df.columns)[counts[level] > 0]] for level in self.levels
+        ])
@@ -0,0 +1,86 @@
+## LINK_DELTA.PY
+# Sparse differences between an RSP run's congestion links (congestion_links.py) and the no-build's
+# Most links barely change between an RSP and the no-build, so rsp_measures.py computes its change measures
+# from only the links that differ (delta()) and the no-build side built once (base(), saved by nobuild_baseline.py).
+# Links are matched on inode, jnode and timeperiod; links on only one side count as 0 volume on the other.
+
+import numpy as np
+import pandas as pd
+import link_keys
+
+KEYS = ['inode', 'jnode', 'timeperiod']
+#link volumes the change measures are sums of
+VALUES = ['AllVMT', 'CongestedVHT', 'CongestedHTruckVHT']
+#link attributes that change how a link's volumes count (vdf: interstate K+A rate)
+ATTRIBUTES = ['vdf']
+
+#volume change at or below which a link counts as unchanged -- 0 keeps every change, so measures are exact
+TOLERANCE = 0
+
+
+def _sorted(links, extra=()):
+    return links[KEYS + VALUES + ATTRIBUTES + list(extra)].sort_values(KEYS, kind='mergesort').reset_index(drop=True)
+
+
+def link_totals(links):
+    """VALUES totals per link (all time periods), indexed by packed link key."""
+    return links[VALUES].groupby(link_keys.keys(links)).sum()
+
+
+def base(links, extra=()):
+    """No-build side of every delta: its links sorted by KEYS, and VALUES totals per link (link_totals()).
+
+    extra: other per-link no-build columns to keep -- each delta row carries them as <column>_nb.
+    """
+    links = _sorted(links, extra)
+    return {
+        'links': links,
+        'link_totals': link_totals(links)
+    }
+
+
+def delta(nb, rsplink, tol=TOLERANCE):
+    """Links that differ between the no-build (from base()) and an RSP run's links.
+
+    a row per link that was added, removed, changed an ATTRIBUTES value, or changed a VALUES volume by more
+    than tol -- with KEYS, <column>_nb and <column>_rsp for VALUES and ATTRIBUTES, and d_<column> (rsp - nb) for VALUES.
+    the no-build's extra base() columns come along as <column>_nb (0 for added links).
+    """
+    nblink = nb['links']
+    rsp = _sorted(rsplink)
+    columns = VALUES + ATTRIBUTES
+    extra = [c for c in nblink.columns if c not in KEYS + columns]
+    if len(rsp) == len(nblink) and all(np.array_equal(nblink[k].to_numpy(), rsp[k].to_numpy()) for k in KEYS):
+        #same links (the usual case) -- compare row by row
+        aligned = pd.concat([nblink[KEYS], nblink[columns + extra].add_suffix('_nb'), rsp[columns].add_suffix('_rsp')], axis=1)
+    else:
+        aligned = pd.merge(nblink.rename(columns=dict([[c, f'{c}_nb'] for c in extra])), rsp, on=KEYS, how='outer', suffixes=('_nb', '_rsp'))
+        volumes = [f'{c}{side}' for c in VALUES for side in ['_nb', '_rsp']] + [f'{c}_nb' for c in extra]
+        aligned[volumes] = aligned[volumes].fillna(0)
+
+    #added/removed links have a null attribute on one side, so they're always kept
+    changed = np.zeros(len(aligned), dtype=bool)
+    for c in ATTRIBUTES:
+        changed |= (aligned[f'{c}_nb'] != aligned[f'{c}_rsp']).to_numpy()
+    for c in VALUES:
+        aligned[f'd_{c}'] = aligned[f'{c}_rsp'] - aligned[f'{c}_nb']
+        changed |= (aligned[f'd_{c}'].abs() > tol).to_numpy()
+    return aligned.loc[changed].reset_index(drop=True)
+
+
+def side(d, which):
+    """One side ('nb' or 'rsp') of a delta's rows, with the original column names (for per-link functions like rsp_measures.annual_ka)."""
+    columns = VALUES + ATTRIBUTES
+    return d[KEYS + [f'{c}_{which}' for c in columns]].rename(columns=dict([[f'{c}_{which}', c] for c in columns]))
+
+
+def corridor_change(nb, d, column, nb_corridor, rsp_corridor):
+    """Change in a VALUES column summed over a corridor: the RSP's links in rsp_corridor minus the no-build's in nb_corridor.
+
+    corridors are link keys (link_keys.read_corridor()).
+    the two corridors can differ (the RSP's includes its new links) -- the no-build totals cover both and
+    the delta rows in rsp_corridor add the RSP's changes.
+    """
+    totals = nb['link_totals'][column]
+    changes = d.loc[link_keys.isin(link_keys.keys(d), rsp_corridor), f'd_{column}'].sum()
+    return totals.reindex(np.unique(rsp_corridor)).sum() - totals.reindex(np.unique(nb_corridor)).sum() + changes
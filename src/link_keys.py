@@ -0,0 +1,87 @@
+## LINK_KEYS.PY
+# Packed link keys for the inode/jnode joins between link tables (punchlink links, Select_Link project links,
+# *_corridor_70029.csv corridor links, extra_links_70029.csv EDA volumes, no-build/RSP congestion links)
+# Emme node numbers fit in 32 bits, so a directional link is one int64: inode in the high half, jnode in the
+# low half. Sorted keys are in inode, jnode order. Membership flags and attribute lookups are binary
+# searches (np.searchsorted) on sorted keys instead of pd.merge on two columns.
+
+import numpy as np
+import pandas as pd
+
+
+def pack(inode, jnode):
+    """int64 link keys from inode and jnode arrays."""
+    return (np.asarray(inode, dtype=np.int64) << 32) | np.asarray(jnode, dtype=np.int64)
+
+
+def unpack(keys):
+    """(inode, jnode) arrays from packed link keys."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+def keys(df, inode='inode', jnode='jnode'):
+    """Packed link keys of a table's rows."""
+    return pack(df[inode].to_numpy(), df[jnode].to_numpy())
+
+
+class LinkIndex:
+    """Link keys sorted once, for any number of lookups of other tables' links.
+
+    find() gives each looked-up key's row in the indexed table (its first row, if the key repeats).
+    """
+
+    def __init__(self, link_keys):
+        link_keys = np.asarray(link_keys, dtype=np.int64)
+        self.order = np.argsort(link_keys, kind='stable')
+        self.sorted = link_keys[self.order]
+
+    def __len__(self):
+        return len(self.sorted)
+
+    def find(self, link_keys):
+        """Row of each key in the indexed table, -1 where it isn't there."""
+        link_keys = np.asarray(link_keys, dtype=np.int64)
+        if len(self.sorted) == 0:
+            return np.full(len(link_keys), -1)
+        i = np.searchsorted(self.sorted, link_keys).clip(max=len(self.sorted) - 1)
+        return np.where(self.sorted[i] == link_keys, self.order[i], -1)
+
+    def contains(self, link_keys):
+        """True where a key is in the indexed table."""
+        return self.find(link_keys) >= 0
+
+    def lookup(self, link_keys, values, fill=np.nan):
+        """values (one per indexed row) for each key, fill where the key isn't indexed -- a left merge of one column."""
+        rows = self.find(link_keys)
+        values = np.asarray(values)
+        if not (rows < 0).any():
+            return values[rows]
+        out = values[rows.clip(min=0)].astype(np.result_type(values, np.asarray(fill)))
+        out[rows < 0] = fill
+        return out
+
+
+def isin(link_keys, members):
+    """True where a key is one of members (any link keys) -- a membership flag without a merge."""
+    members = np.unique(np.asarray(members, dtype=np.int64))
+    if len(members) == 0:
+        return np.zeros(len(link_keys), dtype=bool)
+    link_keys = np.asarray(link_keys, dtype=np.int64)
+    i = np.searchsorted(members, link_keys).clip(max=len(members) - 1)
+    return members[i] == link_keys
+
+
+## ------------------------
+## LINK LISTS
+## ------------------------
+
+def read_select_links(path):
+    """Project link keys from a Select_Link file (a header line, then 'l=<inode>,<jnode>' lines)."""
+    links = pd.read_csv(path, skiprows=1, names=['inode', 'jnode'])
+    return pack(links['inode'].str.replace('l=', '').astype(int), links['jnode'].astype(int))
+
+
+def read_corridor(path):
+    """Corridor link keys from a *_corridor_70029.csv (select_by_location.py)."""
+    return keys(pd.read_csv(path), 'INODE', 'JNODE')
@@ -0,0 +1,122 @@
+## LINK_METRICS.PY
+# Link performance metrics shared by congestion_metrics_EDA.py, rsp_emissions_2.py and BCA_calc_3.py
+# Volume equivalents, vehicles by class, capacity, LOS-C adjusted arterial speeds and VMT/VHT are
+# calculated once per model run from punchlink, saved to
+# Database\rsp_evaluation\results\link_metrics.npz, and read back by every script after that.
+# The saved metrics don't depend on bca_parameters.csv -- the congested flag (which uses
+# vc_threshold) is applied by each script with congested().
+
+import numpy as np
+import pandas as pd
+import colstore
+import punchlink
+
+#punchlink columns the metrics are calculated from
+INPUT_COLS = [
+    'timeperiod', 'lan', 'vdf', 'len', 'emcap', 'timau', 'ftime',
+    'avauv', 'avh2v', 'avh3v', 'avbqv', 'avlqv', 'avmqv', 'avhqv', 'busveq', 'm200', 'h200'
+]
+
+#vehicle classes (in vehicles, not volume equivalents)
+AUTO_CLASSES = ['sov', 'hov2', 'hov3', 'pvt_vehicles']
+FREIGHT_CLASSES = ['bplate', 'ltruck', 'mtruck', 'htruck', 'bus', 'mtrucklh', 'htrucklh']
+
+#columns saved in link_metrics.npz, one row per punchlink row
+METRIC_COLS = ['volau', 'vehicles'] + AUTO_CLASSES + FREIGHT_CLASSES + [
+    'hours', 'capacity', 'fmph', 'mph', 'lanemi', 'all_vmt', 'all_vht'
+]
+
+#hours in each highway time period (for capacity)
+TIMEPERIOD_HOURS = {1: 5, 2: 1, 3: 2, 4: 1, 5: 4, 6: 2, 7: 2, 8: 2}
+
+
+def compute(df):
+    """Link metrics for punchlink rows (needs INPUT_COLS). returns a frame of METRIC_COLS on df's index."""
+    m = pd.DataFrame(index=df.index)
+
+    ##--- total volume in vehicle equivalents (for v/c ratio) ---
+    m['volau'] = df[['avauv', 'avh2v', 'avh3v', 'avbqv', 'avlqv', 'avmqv', 'avhqv', 'busveq']].sum(axis=1)
+
+    #long-haul trucks come out of the medium/heavy truck volume equivalents
+    m200 = np.minimum(df['m200'], df['avmqv'])
+    avmqv = np.maximum(df['avmqv'] - m200, 0)
+    h200 = np.minimum(df['h200'], df['avhqv'])
+    avhqv = np.maximum(df['avhqv'] - h200, 0)
+
+    ##--- volume in # vehicles (for VMT/VHT) ---
+    m['sov'] = df['avauv']
+    m['hov2'] = df['avh2v']
+    m['hov3'] = df['avh3v']
+    m['pvt_vehicles'] = m['sov'] + m['hov2'] + m['hov3']
+    m['bplate'] = df['avbqv']
+    m['ltruck'] = df['avlqv']
+    m['mtruck'] = avmqv / 2
+    m['htruck'] = avhqv / 3
+    m['bus'] = df['busveq'] / 3
+    m['mtrucklh'] = m200 / 2
+    m['htrucklh'] = h200 / 3
+    m['vehicles'] = m[['pvt_vehicles'] + FREIGHT_CLASSES].sum(axis=1)
+
+    ## -- Link capacity -- ##
+    m['hours'] = df['timeperiod'].map(TIMEPERIOD_HOURS).fillna(2)
+    m['capacity'] = df['lan'] * df['emcap'].astype(float) * m['hours']     #emcap can be float32 (punchlink.DTYPES)
+
+    ## -- Arterial speed adjustment due to LOS C used in VDF (for VHT) -- ##
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m['fmph'] = np.where(df['ftime'] > 0, df['len'] / (df['ftime'] / 60), 20)
+        m['mph'] = np.where(df['timau'] > 0, df['len'] / (df['timau'] / 60), 0)
+        adjusted = m['fmph'] * (1 / ((np.log(m['fmph']) * 0.249) + 0.153 * (m['volau'] / (m['capacity'] * 0.75))**3.98))
+    m.loc[df['vdf'] == 1, 'mph'] = adjusted
+
+    ## -- Lane miles, VMT, VHT -- ##
+    m['lanemi'] = df['lan'] * df['len']
+    m['all_vmt'] = m['vehicles'] * df['len']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m['all_vht'] = np.where(m['mph'] > 0, m['all_vmt'] / m['mph'], 0)
+
+    return m[METRIC_COLS]
+
+
+def congested(links, vc_threshold):
+    """1 where a link's v/c ratio is at or above vc_threshold (bca_parameters.csv), otherwise 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((links['capacity'] > 0) & (links['volau'] / links['capacity'] >= vc_threshold)).astype(np.int8)
+
+
+def path(run):
+    return run + '\\Database\\rsp_evaluation\\results\\link_metrics.npz'
+
+
+def read_chunks(run, rows):
+    """Punchlink columns plus link metrics, rows at a time -- metrics are calculated per chunk and not saved."""
+    for chunk in punchlink.read_chunks(run, rows):
+        yield pd.concat([chunk, compute(chunk)], axis=1)
+
+
+def read_link_metrics(run, columns=None):
+    """Punchlink columns plus link metrics for a run, calculating and saving the metrics if needed.
+
+    columns can mix punchlink columns and METRIC_COLS (default: everything). the metrics are
+    recalculated whenever punchlink.csv has changed since they were saved.
+    """
+    csv = punchlink.paths(run)[0]
+    store = path(run)
+
+    base_cols = None if columns is None else [c for c in columns if c not in METRIC_COLS]
+    metric_cols = None if columns is None else [c for c in columns if c in METRIC_COLS]
+    if colstore.is_current(store, csv):
+        print('  -- using saved link metrics')
+        metrics = colstore.read_columns(store, metric_cols)
+    else:
+        print('  -- calculating link metrics...')
+        metrics = compute(punchlink.read_punchlink(run, INPUT_COLS))
+        try:
+            colstore.write_columns(metrics, store, meta=colstore.source_key(csv))
+        except OSError as e:
+            print(f'  -- could not save {store}: {e}')
+        #use what was just calculated -- not the store, which may be missing or stale if the save failed
+        if metric_cols is not None:
+            metrics = metrics[metric_cols]
+
+    links = pd.concat([punchlink.read_punchlink(run, base_cols), metrics], axis=1)
+    return links if columns is None else links[columns]
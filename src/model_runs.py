@@ -0,0 +1,61 @@
+## MODEL_RUNS.PY
+# The model runs in a folder of RSP runs, and bca_parameters.csv values
+# Standard library only, so build_graph.py and rsp_pms.py can list runs and check what's current
+# without loading pandas.
+
+import os
+import csv
+import fnmatch
+
+
+def find_runs(dir):
+    """Model runs in a folder of RSP runs.
+
+    returns (nobuild name, nobuild model folder, rsp_runs_dir) where rsp_runs_dir is
+    {<rsp_name>: [<model run filepath>, <'link' or 'line'>, <select_link or select_line file>]},
+    in run name order.
+    """
+    runs = sorted(fnmatch.filter(os.listdir(dir), '*RSP*'))
+    nobuilds = [run for run in runs if 'RSP00' in run]
+    rsp_runs = [run for run in runs if run not in nobuilds]
+
+    #check to make sure nobuild and rsp_runs exist and are non-empty
+    if len(nobuilds) != 1 or len(runs) == 0:
+        raise ValueError(f'''Somethin' ain't right. Hold yer horses an' check the following, partner:
+        - Is this the correct folder of RSP model runs?: {dir}
+        - Is the base year model run labeled using 'RSP00' in the name?
+        - Is there more than one base year model run? If so, remove all but one.
+    ''')
+    nobuild = nobuilds[0]
+    nobuild_dir = os.path.join(dir, nobuild, 'cmap_trip-based_model')
+
+    #check whether rsp is highway or transit
+    rsp_runs_dir = {}
+    for run in rsp_runs:
+        rsp = run.split('_')[0]
+        run_dir = os.path.join(dir, run, 'cmap_trip-based_model')
+        slink_file = os.path.join(run_dir, f'Database/Select_Link/{rsp}_links.txt')
+        sline_file = os.path.join(run_dir, f'Database/Select_Line/{rsp}_line.txt')
+        link = os.path.exists(slink_file) # truthy, looking for select_links.txt
+        line = os.path.exists(sline_file) # truthy, looking for select_line.txt
+        if link and line:
+            raise ValueError(f'There are both select_line AND select_link files in {run} when only one is permitted for RSP evaluations.')
+        if not line and not link:
+            raise ValueError(f'No select link or select line file detected in {run}. Check if ../Database/Select_Link/{rsp}_links.txt exists (or {rsp}_line.txt).')
+        if link:    #roadway projects
+            rsp_runs_dir[run] = [run_dir, 'link', slink_file]
+        else:       #transit projects
+            rsp_runs_dir[run] = [run_dir, 'line', sline_file]
+
+    return nobuild, nobuild_dir, rsp_runs_dir
+
+
+def read_parameters(path):
+    """bca_parameters.csv as a {parameter name: value} dictionary."""
+    params = {}
+    with open(path, 'r') as file:
+        csvreader = csv.reader(file)
+        next(csvreader) #skip first row of headers
+        for row in csvreader:
+            params[row[0]] = float(row[1]) #first entry (row[0]) is parameter name, second (row[1]) is value
+    return params
@@ -0,0 +1,186 @@
+## MONTE_CARLO.PY
+# Uncertainty ranges for BCA totals and comparison measures, from distributions of bca_parameters.csv values
+# Each RSP run's measures are linear in the parameters once its parameter-independent totals are known
+# (bca_statistics.csv from BCA_calc_3.py, see bca_costs.py; VMT by interstate/non-interstate for K+A),
+# so every draw of the parameters is evaluated at once as array operations. Runs are spread over a
+# process pool; each run's draws come from its own seed (the --seed plus the run's name), so results
+# don't depend on the number of workers or which runs are in the folder.
+#
+# Distributions file (csv): parameter,distribution,a,b,c
+#   normal      a = mean, b = standard deviation
+#   lognormal   a = median, b = sigma of log values
+#   uniform     a = low, b = high
+#   triangular  a = low, b = mode, c = high
+#   fixed       a = value
+# parameters not listed keep their bca_parameters.csv value. vc_threshold and occupancy_hov3 are
+# applied before the saved totals (congestion stage, BCA_calc_3.py) and can't be varied here.
+#
+# usage: python monte_carlo.py <folder of RSP runs> <distributions csv> [--draws 10000] [--seed 0]
+#            [--workers N] [--percentiles 5 50 95] [--params <bca_parameters.csv>] [--output <csv>]
+
+import os
+import zlib
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import bca_costs
+import rsp_measures
+import congestion_links
+import nobuild_baseline
+
+src = os.path.dirname(os.path.abspath(__file__))
+
+#parameters that change the saved totals themselves -- not varied
+FIXED_PARAMETERS = ['vc_threshold', 'occupancy_hov3', 'corridor_distance', 'sl_classes']
+
+#vdf of interstate links (for K+A rates)
+INTERSTATE_VDF = [2, 3, 4, 5, 8]
+
+
+## ------------------------
+## DRAWS
+## ------------------------
+
+def read_distributions(path):
+    """Distributions file as {parameter: [distribution, a, b, c]}."""
+    df = pd.read_csv(path)
+    df.columns = [c.strip() for c in df.columns]
+    spec = {}
+    for _, row in df.iterrows():
+        if row['parameter'] in FIXED_PARAMETERS:
+            raise ValueError(f"{row['parameter']} can't be varied by monte_carlo.py -- it's applied before the saved totals.")
+        spec[row['parameter']] = [row['distribution'].strip().lower()] + [row.get(x) for x in ['a', 'b', 'c']]
+    return spec
+
+
+def draw(parameters, spec, n, rng):
+    """n draws of every parameter: {parameter: array of n}. parameters without a distribution are repeated."""
+    draws = dict([[k, np.full(n, v, dtype=float)] for k, v in parameters.items()])
+    for name in sorted(spec):
+        kind, a, b, c = spec[name]
+        if kind == 'normal':
+            values = rng.normal(a, b, n)
+        elif kind == 'lognormal':
+            values = a * rng.lognormal(0, b, n)
+        elif kind == 'uniform':
+            values = rng.uniform(a, b, n)
+        elif kind == 'triangular':
+            values = rng.triangular(a, b, c, n)
+        elif kind == 'fixed':
+            values = np.full(n, a, dtype=float)
+        else:
+            raise ValueError(f'Unknown distribution {kind!r} for {name}.')
+        draws[name] = values
+    return draws
+
+
+def run_seed(seed, run):
+    """Seed for one run's draws -- the same for a run whatever else is being evaluated alongside it."""
+    return np.random.SeedSequence([seed, zlib.crc32(run.encode('utf-8'))])
+
+
+## ------------------------
+## MEASURES
+## ------------------------
+
+def ka_vmt(links):
+    """AllVMT on non-interstate and interstate links (congestion stage links), the totals K+A is linear in."""
+    interstate = links['vdf'].isin(INTERSTATE_VDF)
+    return links.loc[~interstate, 'AllVMT'].sum(), links.loc[interstate, 'AllVMT'].sum()
+
+
+def run_totals(run, info, nb):
+    """A run's saved parameter-independent totals: BCA statistics (or None) and the K+A VMT change (or None).
+
+    nb: the no-build's ka_vmt().
+    """
+    run_dir, runtype = info[0], info[1]
+    path = bca_costs.statistics_path(run_dir)
+    stats = pd.read_csv(path) if os.path.exists(path) else None
+    ka = None
+    if runtype == 'link' and congestion_links.exists(run_dir):
+        rsp = ka_vmt(rsp_measures.read_links(run_dir, ['vdf', 'AllVMT']))
+        ka = [rsp[0] - nb[0], rsp[1] - nb[1]]
+    return stats, ka
+
+
+def simulate(run, info, nb, parameters, spec, n, seed, percentiles):
+    """Percentiles of every parameter-dependent measure for one run. returns (run, rows, log text)."""
+    stats, ka = run_totals(run, info, nb)
+    draws = draw(parameters, spec, n, np.random.default_rng(run_seed(seed, run)))
+
+    results = {}
+    if stats is not None:
+        for _, s in stats.iterrows():
+            for measure, values in bca_costs.bca_totals(s, draws).items():
+                results[f"{s['geog']}: {measure}"] = values
+    if ka is not None:
+        #K+A rates are per 100,000,000 VMT
+        results['measure_change_in_fatalities_and_serious_injuries_per_year'] = (
+            draws['ann_factor'] * (draws['SAFE_nikarate'] * ka[0] + draws['SAFE_ikarate'] * ka[1]) / 100000000
+        )
+
+    rows = []
+    for measure, values in results.items():
+        values = np.broadcast_to(values, (n,))
+        row = {'ID': run, 'measure': measure, 'mean': values.mean()}
+        row.update(dict(zip([f'p{p:g}' for p in percentiles], np.percentile(values, percentiles))))
+        rows.append(row)
+    log = '' if rows else f'{run}: no bca_statistics.csv or congestion links to draw from'
+    return run, rows, log
+
+
+## ------------------------
+## BATCH
+## ------------------------
+
+def evaluate(dir, distributions, draws=10000, seed=0, workers=None, percentiles=(5, 50, 95), params_file=None, output=None):
+    """Monte Carlo percentiles for every run in a folder of RSP runs. returns the table (also written to output)."""
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    parameters = rsp_measures.read_parameters(params_file)
+    spec = read_distributions(distributions)
+    missing = [p for p in spec if p not in parameters]
+    if missing:
+        raise KeyError(f'{missing} not in {params_file}')
+    nobuild, nobuild_dir, rsp_runs_dir = rsp_measures.find_runs(dir)
+    runs = dict([[nobuild, [nobuild_dir, 'nobuild', None]]] + list(rsp_runs_dir.items()))
+    #no-build VMT split, from its saved baseline (nobuild_baseline.py)
+    nb = ka_vmt(nobuild_baseline.read(nobuild_dir, parameters)['links'])
+
+    start = time.perf_counter()
+    print(f'{draws:,} draws of {len(spec)} parameter(s) for {len(runs)} run(s)...')
+    n = len(runs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        done = list(pool.map(
+            simulate, list(runs), list(runs.values()), [nb] * n, [parameters] * n,
+            [spec] * n, [draws] * n, [seed] * n, [list(percentiles)] * n
+        ))
+    rows = []
+    for run, run_rows, log in done:
+        if log:
+            print(log)
+        rows += run_rows
+    print(f'Done in {time.perf_counter() - start:.1f} s')
+
+    table = pd.DataFrame(rows)
+    if output:
+        table.to_csv(output, index=False)
+        print(f'Table exported to {output}')
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo percentiles of BCA totals and measures over bca_parameters.csv distributions.')
+    parser.add_argument('dir', help='folder containing the RSP model runs')
+    parser.add_argument('distributions', help='csv of parameter,distribution,a,b,c')
+    parser.add_argument('--draws', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--percentiles', type=float, nargs='+', default=[5, 50, 95])
+    parser.add_argument('--params', default=None, help='bca_parameters.csv (default: the one next to this script)')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    evaluate(args.dir, args.distributions, draws=args.draws, seed=args.seed, workers=args.workers,
+             percentiles=args.percentiles, params_file=args.params, output=args.output)
@@ -0,0 +1,155 @@
+## MOVES.PY
+# Shared helpers for the MOVES running-emissions calculations in rsp_emissions_2.py and BCA_calc_3.py
+# Classifies link speeds into MOVES average speed bins and links into MOVES road types,
+# working on whole columns at once instead of row-by-row with Series.apply.
+# Also weights the hourly MOVES rates up to model time periods, so running emissions can be
+# calculated on one row per link and time period (no copying link rows out to every hour/source type)
+
+import numpy as np
+import pandas as pd
+import colstore
+
+## ------------------------
+## SPEED BINS
+## ------------------------
+
+# lower edge of MOVES avgSpeedBinID 2..16 (mph). bin 1 is anything below 2.5 mph,
+# bin 16 is anything 72.5 mph and up. each bin includes its lower edge.
+SPEED_BIN_EDGES = np.arange(2.5, 73, 5.0)
+
+
+def speed_bin(mph):
+    """MOVES avgSpeedBinID (1-16) for an array/Series of link speeds in mph."""
+    mph = np.asarray(mph, dtype=float)
+    if np.isnan(mph).any():
+        raise ValueError('speed_bin got NaN speeds -- check link times/capacities before classifying.')
+    # side='right' puts a speed sitting exactly on an edge into the upper bin (2.5 -> bin 2)
+    return np.searchsorted(SPEED_BIN_EDGES, mph, side='right').astype(np.int8) + 1
+
+
+## ------------------------
+## ROAD TYPES
+## ------------------------
+
+def road_type(vdf, atype):
+    """MOVES roadTypeID for arrays/Series of link vdf and atype.
+
+    arterials (vdf 1 and 6) are unrestricted access (5 urban, 3 rural), everything else is
+    restricted access (4 urban, 2 rural). atype 9 and up is rural. links with a missing
+    atype get 0, which matches no MOVES rate.
+    """
+    vdf = np.asarray(vdf)
+    atype = np.asarray(atype, dtype=float)
+    arterial = np.isin(vdf, [1, 6])
+    return np.select(
+        [arterial & (atype < 9), arterial & (atype >= 9), ~arterial & (atype < 9), ~arterial & (atype >= 9)],
+        [5, 3, 4, 2],
+        default=0
+    ).astype(np.int8)
+
+
+## ------------------------
+## HOURS AND SOURCE TYPES
+## ------------------------
+
+# MOVES hourIDs in each model time period. link VMT in a time period is spread evenly over its hours
+TIMEPERIOD_HOURS = {
+    1: [21, 22, 23, 24, 1, 2, 3, 4, 5, 6],    #8pm-6am
+    2: [7],                                   #6am-7am
+    3: [8, 9],                                #7am-9am
+    4: [10],                                  #9am-10am
+    5: [11, 12, 13, 14],                      #10am-2pm
+    6: [15, 16],                              #2pm-4pm
+    7: [17, 18],                              #4pm-6pm
+    8: [19, 20]                               #6pm-8pm
+}
+
+# MOVES source types that model vehicle classes are split into
+SOURCE_TYPES = [11, 21, 31, 32, 42, 52, 53, 61, 62]
+
+
+def source_type_vmt(auto, bplate, ltruck, mtruck, mtrucklh, htruck, htrucklh, bus):
+    """Split model vehicle-class VMT into MOVES source types. returns {sourceTypeID: vmt}."""
+    return {
+        11: auto * 0.015,                       #from claire's workbook (internal/external flow)
+        21: (auto * 0.985) * 0.55,              #2019 SoS rate
+        31: (auto * 0.985) * 0.45,              #new tbm - bplates just commercial
+        32: bplate,
+        42: bus,
+        52: ltruck + mtruck,                    #light-duty model vehicles are weight plates 10,000lb+, so go in sush
+        53: mtrucklh,
+        61: (htruck + htrucklh) * 0.06,         #from the model it's about 96:4 the other direction, but that's single trips only (not daily total)
+        62: (htruck + htrucklh) * 0.94
+    }
+
+
+## ------------------------
+## RATES
+## ------------------------
+
+# MOVES ID columns in the rate query outputs. the one other column in each file is the rate (grams per mile)
+RATE_KEYS = ['yearID', 'monthID', 'dayID', 'hourID', 'roadTypeID', 'avgSpeedBinID', 'sourceTypeID']
+
+# rate cube axes are the MOVES IDs themselves: [sourceTypeID, avgSpeedBinID, hourID, roadTypeID]
+CUBE_SHAPE = (max(SOURCE_TYPES) + 1, 17, 25, 6)
+
+
+def load_rate_cube(rate_files):
+    """Load MOVES running rate tables into dense rate arrays.
+
+    rate_files: {pollutant: path to MOVES rate query csv}
+    returns {pollutant: array[sourceTypeID, avgSpeedBinID, hourID, roadTypeID]} in grams per mile.
+    combinations missing from a table are zero, so they drop out of the totals the same way
+    unmatched rows of a left merge did. the csvs are read through the local binary cache (colstore.py).
+    """
+    cube = {}
+    for pollutant, path in rate_files.items():
+        table = colstore.cached_csv(path)
+        rate_col = [c for c in table.columns if c not in RATE_KEYS]
+        if len(rate_col) != 1:
+            raise ValueError(f'Expected one rate column in {path}, found {rate_col}.')
+        rates = np.zeros(CUBE_SHAPE)
+        np.add.at(
+            rates,
+            (table['sourceTypeID'].values, table['avgSpeedBinID'].values, table['hourID'].values, table['roadTypeID'].values),
+            table[rate_col[0]].values
+        )
+        cube[pollutant] = rates
+    return cube
+
+
+def timeperiod_rates(cube):
+    """Average hourly rate arrays over the hours in each model time period.
+
+    returns {pollutant: array[sourceTypeID, avgSpeedBinID, timeperiod, roadTypeID]}. multiplying a
+    link's whole time period VMT by these gives the same grams as splitting the VMT out to each
+    hour and applying the hourly rates.
+    """
+    tprates = {}
+    for pollutant, rates in cube.items():
+        weighted = np.zeros((rates.shape[0], rates.shape[1], max(TIMEPERIOD_HOURS) + 1, rates.shape[3]))
+        for tp, hours in TIMEPERIOD_HOURS.items():
+            weighted[:, :, tp, :] = rates[:, :, hours, :].mean(axis=2)
+        tprates[pollutant] = weighted
+    return tprates
+
+
+def running_emissions(links, st_vmt, rates):
+    """Running emissions (grams) on each link row for each pollutant.
+
+    links:  frame with timeperiod, roadTypeID and avgSpeedBinID columns
+    st_vmt: {sourceTypeID: vmt} for the whole time period, from source_type_vmt()
+    rates:  {pollutant: rate array} from timeperiod_rates()
+    returns a frame on the links index with one column per pollutant
+    """
+    tp = links['timeperiod'].values.astype(np.intp)
+    speedbin = links['avgSpeedBinID'].values.astype(np.intp)
+    roadtype = links['roadTypeID'].values.astype(np.intp)
+    emissions = pd.DataFrame(index=links.index)
+    for pollutant, tprates in rates.items():
+        grams = np.zeros(len(links))
+        for st in SOURCE_TYPES:
+            #integer gather of each link row's rate for this source type
+            grams += np.asarray(st_vmt[st], dtype=float) * tprates[st, speedbin, tp, roadtype]
+        emissions[pollutant] = grams
+    return emissions
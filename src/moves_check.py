@@ -0,0 +1,109 @@
+## MOVES_CHECK.PY
+# Checks moves.speed_bin() against the row-by-row speedclassify() it replaced in rsp_emissions_2.py
+# and BCA_calc_3.py, and times both.
+# The check runs every bin edge exactly, the next float either side of each edge, negative and
+# infinite speeds, and NaN (speedclassify never assigned a bin for NaN and failed -- speed_bin raises too).
+#
+# usage: python moves_check.py [number of random link rows for the benchmark, default 1000000]
+
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+import moves
+
+
+def speedclassify(mph):
+    #the old row-by-row classifier from rsp_emissions_2.py/BCA_calc_3.py, unchanged
+    if mph < 2.5:
+        avgSpeedBinID = 1
+    elif 2.5 <= mph < 7.5:
+        avgSpeedBinID = 2
+    elif 7.5 <= mph < 12.5:
+        avgSpeedBinID = 3
+    elif 12.5 <= mph < 17.5:
+        avgSpeedBinID = 4
+    elif 17.5 <= mph < 22.5:
+        avgSpeedBinID = 5
+    elif 22.5 <= mph < 27.5:
+        avgSpeedBinID = 6
+    elif 27.5 <= mph < 32.5:
+        avgSpeedBinID = 7
+    elif 32.5 <= mph < 37.5:
+        avgSpeedBinID = 8
+    elif 37.5 <= mph < 42.5:
+        avgSpeedBinID = 9
+    elif 42.5 <= mph < 47.5:
+        avgSpeedBinID = 10
+    elif 47.5 <= mph < 52.5:
+        avgSpeedBinID = 11
+    elif 52.5 <= mph < 57.5:
+        avgSpeedBinID = 12
+    elif 57.5 <= mph < 62.5:
+        avgSpeedBinID = 13
+    elif 62.5 <= mph < 67.5:
+        avgSpeedBinID = 14
+    elif 67.5 <= mph < 72.5:
+        avgSpeedBinID = 15
+    elif mph >= 72.5:
+        avgSpeedBinID = 16
+
+    return avgSpeedBinID
+
+
+def check():
+    """Raise AssertionError where speed_bin() and speedclassify() disagree."""
+    #the edges speedclassify spells out, not moves.SPEED_BIN_EDGES -- so a wrong edge list can't check itself
+    edges = np.array([2.5 + 5 * i for i in range(15)])
+    if not np.array_equal(edges, moves.SPEED_BIN_EDGES):
+        raise AssertionError(f'SPEED_BIN_EDGES {moves.SPEED_BIN_EDGES} != {edges}')
+    speeds = np.concatenate([
+        edges, np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf),
+        [0.0, -0.0, -1e-12, -5.0, -1e9, -np.inf, 1e9, np.inf]
+    ])
+    old = np.array([speedclassify(mph) for mph in speeds])
+    new = moves.speed_bin(speeds)
+    wrong = speeds[old != new]
+    if len(wrong):
+        raise AssertionError(f'speed_bin differs from speedclassify at {list(wrong)}')
+
+    #NaN: both refuse to classify
+    try:
+        speedclassify(np.nan)
+    except UnboundLocalError:
+        pass
+    else:
+        raise AssertionError('speedclassify classified NaN')
+    try:
+        moves.speed_bin(np.array([10.0, np.nan]))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('speed_bin classified NaN')
+    print(f'speed_bin matches speedclassify on {len(speeds)} edge/negative/infinite speeds, and rejects NaN')
+
+
+def benchmark(n):
+    """Time speed_bin()/road_type() against speedclassify() through Series.apply on n random link rows."""
+    rng = np.random.default_rng(0)
+    links = pd.DataFrame({
+        'mph': rng.uniform(0, 80, n),
+        'vdf': rng.integers(1, 9, n),
+        'atype': rng.integers(1, 12, n).astype(float),
+    })
+    if not (links['mph'].apply(speedclassify).values == moves.speed_bin(links['mph'])).all():
+        raise AssertionError('speed_bin does not match speedclassify on the random speeds')
+
+    t_apply = min(timeit.repeat(lambda: links['mph'].apply(speedclassify), number=1, repeat=3))
+    t_vect = min(timeit.repeat(lambda: moves.speed_bin(links['mph']), number=1, repeat=3))
+    t_road = min(timeit.repeat(lambda: moves.road_type(links['vdf'], links['atype']), number=1, repeat=3))
+
+    print(f'{n:,} link rows')
+    print(f'  speedclassify via Series.apply: {t_apply:.3f} s')
+    print(f'  speed_bin (vectorized):         {t_vect:.4f} s  ({t_apply / t_vect:,.0f}x faster)')
+    print(f'  road_type (vectorized):         {t_road:.4f} s')
+
+
+if __name__ == '__main__':
+    check()
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,372 @@
+## NETWORK.PY
+# Where network data comes from: Emme (Modeller API), or recorded tables replayed from files
+# export_geog.py and BCA_calc_3.py only talk to a backend through two calls:
+#   transit_segment_values(scenario, attributes) -> {column: array}, every transit segment's attributes
+#                                                   (the columns of a net calc full report, plus its line's mode)
+#   export_shapefile(scenario, export_path, selection=None)
+# so the extraction steps (transit punch creation etc.) can run on a machine without an Emme license.
+# Backends also answer network_calculation(scenario, expression, selections) -> (header, rows), net_calc's
+# full_report['table'] -- the way segments were read before, kept to check the array path against
+# (check_segments(), and recordings made before the array path, which are replayed from their report tables).
+#
+# Picking a backend (open_backend()):
+#   default                        Emme -- starts Emme desktop on the run's .emp project the first time it's needed
+#   RSP_NETWORK_RECORD=<folder>    Emme, and also saves every table/export under <folder> for replay later
+#   RSP_NETWORK_REPLAY=<folder>    no Emme -- answers every call from tables/exports recorded under <folder>
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+#transit line modes for bus (CTA bus and Pace) and rail (Metra and CTA rail)
+TRANSIT_MODES = {
+    'bus': ['B', 'E', 'P', 'Q', 'L'],
+    'rail': ['C', 'M']
+}
+
+#net calc names of the transit segment attributes used here -> (report column, value for a segment)
+SEGMENT_ATTRIBUTES = {
+    'length': ['len', lambda seg: seg.link.length],
+    'hdw': ['hdwy', lambda seg: seg.line.headway],
+    'voltr': ['voltr', lambda seg: seg.transit_volume],
+    'us1': ['us1', lambda seg: seg.data1]
+}
+#extra attributes (@name) are read from whichever network element they're defined on
+EXTRA_ATTRIBUTE_ON = {
+    'TRANSIT_SEGMENT': lambda seg: seg,
+    'TRANSIT_LINE': lambda seg: seg.line,
+    'LINK': lambda seg: seg.link,
+    'NODE': lambda seg: seg.i_node
+}
+
+
+def find_emp(run):
+    """The Emme project (.emp) file in a 'cmap_trip-based_model' run folder."""
+    return [os.path.join(run, file) for file in os.listdir(run) if file.endswith('.emp')][0]
+
+
+def call_key(kind, scenario, *args):
+    """File-name-safe key for one backend call (used to record and replay it)."""
+    spec = json.dumps([kind, scenario] + [' '.join(str(a).split()) if isinstance(a, str) else a for a in args], sort_keys=True)
+    return f'{kind}_{scenario}_' + hashlib.sha1(spec.encode('utf-8')).hexdigest()[:12]
+
+
+def copy_files(from_dir, to_dir):
+    """Copy every file in from_dir into to_dir (created if needed)."""
+    os.makedirs(to_dir, exist_ok=True)
+    for file in os.listdir(from_dir):
+        shutil.copy2(os.path.join(from_dir, file), os.path.join(to_dir, file))
+
+
+## ------------------------
+## EMME
+## ------------------------
+
+class EmmeBackend:
+    """Network data from Emme, through the Modeller API. Emme desktop starts on first use."""
+
+    def __init__(self, emp_file, visible=False):
+        self.emp_file = emp_file
+        self.visible = visible
+        self._modeller = None
+
+    def _start(self):
+        if self._modeller is None:
+            #import emme desktop and initialize emme
+            import inro.emme.desktop.app as _app
+            import inro.modeller as _m
+            desktop = _app.start_dedicated(
+                visible=self.visible,
+                user_initials="cmap",
+                project=self.emp_file
+            )
+            self._modeller = _m.Modeller(desktop=desktop)
+        return self._modeller
+
+    def _tool(self, name):
+        return self._start().tool(name)
+
+    def _scenario(self, scenario):
+        return self._start().emmebank.scenario(scenario)
+
+    def network_calculation(self, scenario, expression, selections):
+        """Run a network calculation with a full report. returns (header, rows) of the report table."""
+        net_calc = self._tool('inro.emme.network_calculation.network_calculator')
+        spec = {
+            "expression": expression,
+            "aggregation": None,
+            "selections": selections,
+            "type": "NETWORK_CALCULATION"
+        }
+        report = net_calc(specification=json.dumps(spec), scenario=self._scenario(scenario), full_report=True)
+        return report['table'][0], report['table'][1:]
+
+    def transit_segment_values(self, scenario, attributes):
+        """Every transit segment's attributes, read from the scenario's network in one pass.
+
+        attributes: attribute names joined by '+', as in a net calc expression (e.g. 'length+hdw+voltr+us1+@zone').
+        returns {column: array} with the columns a net calc full report on the segments has -- 'inode', 'jnode',
+        'line', one per attribute and 'result' (the expression's value) -- plus 'mode', each segment's line mode.
+        check_segments() compares these against the report itself.
+        """
+        scen = self._scenario(scenario)
+        columns = []
+        #standard attributes first, then extra attributes, as in the report
+        for name in sorted(attributes.split('+'), key=lambda name: name.startswith('@')):
+            if name.startswith('@'):
+                on = EXTRA_ATTRIBUTE_ON[scen.extra_attribute(name).type]
+                columns.append([name, lambda seg, on=on, name=name: on(seg)[name]])
+            else:
+                columns.append(SEGMENT_ATTRIBUTES[name])
+        segments = list(scen.get_partial_network(['LINK', 'TRANSIT_SEGMENT'], include_attributes=True).transit_segments(include_hidden=False))
+
+        #each column straight into an array
+        count = len(segments)
+        values = {
+            'inode': np.fromiter((seg.i_node.number for seg in segments), dtype=np.int64, count=count),
+            'jnode': np.fromiter((seg.j_node.number for seg in segments), dtype=np.int64, count=count),
+            'line': np.array([seg.line.id for seg in segments], dtype=object)
+        }
+        for name, value in columns:
+            values[name] = np.fromiter((value(seg) for seg in segments), dtype=np.float64, count=count)
+        values['result'] = sum(values[name] for name, value in columns)
+        values['mode'] = np.array([seg.line.mode.id for seg in segments], dtype=object)
+        return values
+
+    def export_shapefile(self, scenario, export_path, selection=None):
+        """Export a scenario's network (optionally a selection of it) as shapefiles in export_path."""
+        export = self._tool('inro.emme.data.network.export_network_as_shapefile')
+        kwargs = {'selection': selection} if selection else {}
+        export(
+            export_path=export_path,
+            view_results_flag=False,
+            transit_shapes='LINES_AND_SEGMENTS',
+            scenario=self._scenario(scenario),
+            **kwargs
+        )
+
+
+class RecordingBackend:
+    """Wraps another backend and saves every result to a folder, for ReplayBackend."""
+
+    def __init__(self, backend, folder):
+        self.backend = backend
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def network_calculation(self, scenario, expression, selections):
+        header, rows = self.backend.network_calculation(scenario, expression, selections)
+        path = os.path.join(self.folder, call_key('netcalc', scenario, expression, selections) + '.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return header, rows
+
+    def transit_segment_values(self, scenario, attributes):
+        values = self.backend.transit_segment_values(scenario, attributes)
+        path = os.path.join(self.folder, call_key('segments', scenario, attributes) + '.npz')
+        #text columns (line, mode) saved as fixed-width strings, so they load without pickle
+        np.savez(path, **dict([[name, v.astype(str) if v.dtype == object else v] for name, v in values.items()]))
+        return values
+
+    def export_shapefile(self, scenario, export_path, selection=None):
+        self.backend.export_shapefile(scenario, export_path, selection)
+        copy_files(export_path, os.path.join(self.folder, call_key('export', scenario, selection)))
+
+
+## ------------------------
+## REPLAY
+## ------------------------
+
+def _value(text):
+    """Recorded csv text back to the int/float/str Emme reported."""
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+class ReplayBackend:
+    """Network data replayed from tables/exports saved by RecordingBackend. no Emme needed."""
+
+    def __init__(self, folder):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f'No recorded network data folder at {folder}.')
+        self.folder = folder
+
+    def _recorded(self, name):
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(path):
+            raise KeyError(f'{name} was never recorded in {self.folder} -- record it with RSP_NETWORK_RECORD on a machine with Emme.')
+        return path
+
+    def network_calculation(self, scenario, expression, selections):
+        path = self._recorded(call_key('netcalc', scenario, expression, selections) + '.csv')
+        with open(path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            rows = [[_value(v) for v in row] for row in reader]
+        return header, rows
+
+    def transit_segment_values(self, scenario, attributes):
+        with np.load(self._recorded(call_key('segments', scenario, attributes) + '.npz')) as values:
+            return dict([[c, values[c].astype(object) if values[c].dtype.kind == 'U' else values[c]] for c in values.files])
+
+    def export_shapefile(self, scenario, export_path, selection=None):
+        copy_files(self._recorded(call_key('export', scenario, selection)), export_path)
+
+
+def open_backend(run, visible=False):
+    """Network backend for a model run folder -- see the top of this file for the environment switches.
+
+    visible: show the Emme desktop window (when it's started).
+
+    recordings are kept in a subfolder per run, named after the folder above 'cmap_trip-based_model' (e.g. 'RSP57_700').
+    """
+    rsp_name = os.path.basename(os.path.dirname(os.path.abspath(run)))
+    replay = os.environ.get('RSP_NETWORK_REPLAY')
+    if replay:
+        print(f'  -- replaying recorded network data from {os.path.join(replay, rsp_name)}')
+        return ReplayBackend(os.path.join(replay, rsp_name))
+    backend = EmmeBackend(find_emp(run), visible)
+    record = os.environ.get('RSP_NETWORK_RECORD')
+    if record:
+        print(f'  -- recording network data to {os.path.join(record, rsp_name)}')
+        return RecordingBackend(backend, os.path.join(record, rsp_name))
+    return backend
+
+
+## ------------------------
+## TRANSIT SEGMENTS
+## ------------------------
+
+#mode codes in transit_arrays() -- index into TRANSIT_MODE_NAMES
+TRANSIT_MODE_NAMES = list(TRANSIT_MODES)
+
+#net calc line selection for each mode in the report path, and a line mode standing in for them
+REPORT_SELECTIONS = {
+    'bus': ['mode=B or mode=E or mode=P or mode=Q or mode=L', 'B'],
+    'rail': ['mode=C or mode=M', 'C']
+}
+
+
+def _column(values):
+    """One recorded report table column as a typed array (int64/float64 for numbers, object for text like line names)."""
+    if values and isinstance(values[0], str):
+        return np.array(values, dtype=object)
+    return np.array(values)
+
+
+def report_values(backend, scenario, attributes):
+    """transit_segment_values() the way it was done before: a net calc full report for each mode, rows to columns."""
+    columns = {}
+    for mode in REPORT_SELECTIONS:
+        header, rows = backend.network_calculation(scenario, attributes, {"link": "all", "transit_line": REPORT_SELECTIONS[mode][0]})
+        values = list(zip(*rows)) if rows else [[] for _ in header]
+        for name, v in zip(header, values):
+            columns.setdefault(name, []).append(_column(list(v)))
+        columns.setdefault('mode', []).append(np.full(len(rows), REPORT_SELECTIONS[mode][1], dtype=object))
+    return dict([[name, np.concatenate(v)] for name, v in columns.items()])
+
+
+def segment_values(backend, scenario, attributes):
+    """backend.transit_segment_values() -- or, replaying a recording made before it existed, the recorded reports."""
+    try:
+        return backend.transit_segment_values(scenario, attributes)
+    except KeyError:
+        if not isinstance(backend, ReplayBackend):
+            raise
+        return report_values(backend, scenario, attributes)
+
+
+def transit_arrays(backend, scenarios, attributes, values=segment_values):
+    """Transit segment attributes for each scenario as typed numpy arrays, bus and rail together.
+
+    attributes: attribute names joined by '+', e.g. 'length+hdw+voltr+us1+@zone'
+    returns {column: array} -- the report table columns ('@' taken off extra attribute names),
+    'timeperiod' (scenario, int16) and 'mode' (int8 code into TRANSIT_MODE_NAMES).
+    each scenario's segments are read once, as arrays; segments on lines of other modes are left out.
+    values: how a scenario's segments are read (segment_values(), or report_values() for the report path).
+    """
+    parts = {}
+    for tp in scenarios:
+        print(f'  -- Obtaining transit link data for scenario {tp}...')
+        columns = values(backend, tp, attributes)
+        line_modes = columns.pop('mode')
+        codes = np.full(len(line_modes), -1, dtype=np.int8)
+        for code, mode in enumerate(TRANSIT_MODE_NAMES):
+            codes[np.isin(line_modes, TRANSIT_MODES[mode])] = code
+        #bus segments, then rail
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        for name, v in columns.items():
+            parts.setdefault(name, []).append(v[order])
+        parts.setdefault('timeperiod', []).append(np.full(len(order), tp, dtype=np.int16))
+        parts.setdefault('mode', []).append(codes[order])
+
+    #clean up column names
+    return dict([[a[1:] if a.startswith('@') else a, np.concatenate(v)] for a, v in parts.items()])
+
+
+def transit_segments(backend, scenarios, attributes):
+    """Transit segment attributes for each scenario, bus and rail separately (see transit_arrays()).
+
+    returns a DataFrame with 'timeperiod' (scenario) and 'mode' ('bus'/'rail', categorical) columns.
+    """
+    arrays = transit_arrays(backend, scenarios, attributes)
+    arrays['mode'] = pd.Categorical.from_codes(arrays['mode'], categories=TRANSIT_MODE_NAMES)
+    return pd.DataFrame(arrays)
+
+
+def check_segments(backend, scenarios, attributes):
+    """Compare the array path with the net calc report path for the same segments. returns a list of differences.
+
+    rows are compared in (timeperiod, mode, line, inode, jnode) order -- the two paths needn't list segments the same way.
+    """
+    new = transit_arrays(backend, scenarios, attributes)
+    old = transit_arrays(backend, scenarios, attributes, values=report_values)
+    if list(new) != list(old):
+        return [f'columns differ: {list(new)} (arrays) vs {list(old)} (report)']
+    if len(new['line']) != len(old['line']):
+        return [f"segment counts differ: {len(new['line']):,} (arrays) vs {len(old['line']):,} (report)"]
+    keys = ['jnode', 'inode', 'line', 'mode', 'timeperiod']
+    new_order = np.lexsort([new[k].astype(str) if k == 'line' else new[k] for k in keys])
+    old_order = np.lexsort([old[k].astype(str) if k == 'line' else old[k] for k in keys])
+    differences = []
+    for name in new:
+        a, b = new[name][new_order], old[name][old_order]
+        same = (a == b).all() if a.dtype == object or b.dtype == object else np.allclose(a, b, rtol=1e-9, atol=0, equal_nan=True)
+        if not same:
+            differences.append(f'{name} differs')
+    return differences
+
+
+## ------------------------
+## BENCHMARK / CHECK
+## ------------------------
+# python network.py <folder of recorded network data for one run>
+#   times transit punch extraction from a recording, without Emme
+# python network.py check <cmap_trip-based_model folder>
+#   checks the array path against net calc reports (open_backend() -- on Emme, with RSP_NETWORK_RECORD to keep
+#   both for later, or offline with RSP_NETWORK_REPLAY from such a recording)
+
+TRANSIT_ATTRIBUTES = 'length+hdw+voltr+@tot_capacity+@seated_capacity+us1+@tot_vcr+@seated_vcr+@zone'
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'check':
+        differences = check_segments(open_backend(sys.argv[2]), [721, 723, 725, 727], TRANSIT_ATTRIBUTES)
+        print('\n'.join(differences) if differences else 'array path matches the net calc reports')
+        sys.exit(1 if differences else 0)
+    backend = ReplayBackend(sys.argv[1])
+    start = time.perf_counter()
+    segments = transit_segments(backend, [721, 723, 725, 727], 'length+hdw+voltr+us1+@zone')
+    print(f'{len(segments):,} transit segments in {time.perf_counter() - start:.3f} s')
@@ -0,0 +1,102 @@
+## NOBUILD_BASELINE.PY
+# No-build baseline every RSP comparison is measured against (rsp_measures.measures())
+# Built once per no-build run (a build_graph.py stage) and saved as
+# Database\rsp_evaluation\results\nobuild_baseline.npz (colstore.py), so comparisons don't redo no-build work:
+#   links        the no-build congestion links sorted by link (link_delta.base()), with annual_ka at the
+#                bca_parameters.csv rates -- the no-build side of every link delta
+#   link_totals  link_delta.VALUES totals per link, indexed by packed link key (corridor lookups)
+#   totals       regional totals: link_delta.VALUES, annual_ka, transit boardings (voltr) and emissions (co2e, pm)
+# The saved baseline is rebuilt by read() whenever a file it's built from (sources()) has changed, or
+# bca_parameters.csv has different rates.
+#
+# usage: python nobuild_baseline.py <no-build cmap_trip-based_model folder> [<bca_parameters.csv>]
+
+import os
+import sys
+import pandas as pd
+import colstore
+import congestion_links
+import link_delta
+import rsp_measures
+
+src = os.path.dirname(os.path.abspath(__file__))
+
+#per-link no-build values kept with the links (carried into each delta as <column>_nb)
+DERIVED = ['annual_ka']
+#bca_parameters.csv values the derived columns use
+RATES = ['ann_factor', 'SAFE_ikarate', 'SAFE_nikarate']
+
+
+def path(nobuild_dir):
+    return nobuild_dir + '\\Database\\rsp_evaluation\\results\\nobuild_baseline.npz'
+
+
+def sources(nobuild_dir):
+    """Files the baseline is built from: congestion links (the .npz, or an older csv), transit segments and emissions."""
+    npz, csv = congestion_links.paths(nobuild_dir)
+    links = csv if os.path.exists(csv) and not os.path.exists(npz) else npz
+    return [links, nobuild_dir + '\\Database\\data\\transitpunch.csv', nobuild_dir + '\\Database\\rsp_evaluation\\results\\emissions.csv']
+
+
+def build(nobuild_dir, params):
+    """Baseline from the no-build's congestion links, transit segments (if exported) and emissions."""
+    #versions of the files read below, recorded with the baseline (see current())
+    keys = colstore.source_keys(sources(nobuild_dir))
+    links = rsp_measures.read_links(nobuild_dir)
+    links['annual_ka'] = rsp_measures.annual_ka(links, params)
+    baseline = link_delta.base(links, DERIVED)
+
+    totals = dict([[c, float(baseline['links'][c].sum())] for c in link_delta.VALUES + DERIVED])
+    trnt = nobuild_dir + '\\Database\\data\\transitpunch.csv'
+    totals['voltr'] = float(pd.read_csv(trnt, usecols=['voltr'])['voltr'].sum()) if os.path.exists(trnt) else None
+    emissions = pd.read_csv(nobuild_dir + '\\Database\\rsp_evaluation\\results\\emissions.csv')
+    totals['co2e'] = float(emissions.iloc[0, 2])
+    totals['pm'] = float(emissions.iloc[0, 3])
+
+    baseline.update({'dir': nobuild_dir, 'totals': totals, 'rates': dict([[r, params[r]] for r in RATES])}, **keys)
+    return baseline
+
+
+def write(baseline):
+    colstore.write_columns(baseline['links'], path(baseline['dir']), {'totals': baseline['totals'], 'rates': baseline['rates'], 'sources': baseline['sources']})
+
+
+def current(nobuild_dir, params):
+    """True if there's a saved baseline built from the no-build's current files, at params' rates."""
+    meta = colstore.read_meta(path(nobuild_dir))
+    if meta is None or any(meta['rates'].get(r) != params[r] for r in RATES):
+        return False
+    return colstore.is_current(path(nobuild_dir), sources(nobuild_dir))
+
+
+def update(nobuild_dir, params):
+    """Build and save the baseline if the saved one isn't current. returns the new baseline, or None if it was current."""
+    if current(nobuild_dir, params):
+        return None
+    baseline = build(nobuild_dir, params)
+    write(baseline)
+    return baseline
+
+
+def read(nobuild_dir, params):
+    """The saved baseline -- built (and saved) here first if it isn't current."""
+    baseline = update(nobuild_dir, params)
+    if baseline is not None:
+        return baseline
+    meta = colstore.read_meta(path(nobuild_dir))
+    links = colstore.read_columns(path(nobuild_dir))
+    return {
+        'dir': nobuild_dir,
+        'links': links,
+        'link_totals': link_delta.link_totals(links),
+        'totals': meta['totals'],
+        'rates': meta['rates'],
+        'sources': meta['sources']
+    }
+
+
+if __name__ == '__main__':
+    nobuild_dir = sys.argv[1]
+    params_file = sys.argv[2] if len(sys.argv) > 2 else os.path.join(src, 'bca_parameters.csv')
+    write(build(nobuild_dir, rsp_measures.read_parameters(params_file)))
+    print(f'Saved {path(nobuild_dir)}')
@@ -0,0 +1,91 @@
+## PUNCHLINK.PY
+# Typed column store for a model run's Database\data\punchlink.csv
+# The first script to read punchlink for a run converts it to Database\data\punchlink.npz
+# (see colstore.py); every later read pulls just the columns it asks for from that file.
+# The csv is only parsed again when it has changed since the .npz was written.
+# Link columns are kept compact (DTYPES): node numbers, codes and flags as small integers, so several
+# runs' link tables fit in memory together. Volumes, lengths and speeds stay float64 -- they're summed
+# into VMT/VHT and costs.
+
+import numpy as np
+import pandas as pd
+import colstore
+
+#columns that come out of the csv as floats but are really integers, and their compact types
+INT_COLS = ['inode', 'jnode', 'timeperiod', 'lan', 'vdf', 'zone', 'tmpl2', 'imarea']
+DTYPES = {
+    'inode': np.int32, 'jnode': np.int32, 'timeperiod': np.int8, 'lan': np.int8, 'vdf': np.int8,
+    'zone': np.int16, 'tmpl2': np.int16, 'imarea': np.int8,
+    'congested': np.int8, 'projlink': np.float32, 'corrlink': np.float32,
+    #whole numbers (or null) -- float32 holds them exactly
+    'atype': np.float32, 'emcap': np.float32
+}
+
+
+def paths(run):
+    """(punchlink.csv, punchlink.npz) for a 'cmap_trip-based_model' run folder."""
+    data = run + '\\Database\\data'
+    return data + '\\punchlink.csv', data + '\\punchlink.npz'
+
+
+def compact(df):
+    """Link columns in their DTYPES types, where the values fit exactly (otherwise the column is left as it is)."""
+    for x, dtype in DTYPES.items():
+        if x not in df.columns or df[x].dtype == dtype:
+            continue
+        values = df[x].to_numpy()
+        if np.dtype(dtype).kind in 'iu':
+            if values.dtype.kind == 'f' and not np.isfinite(values).all():
+                continue
+            info = np.iinfo(dtype)
+            if len(values) and (values.min() < info.min or values.max() > info.max):
+                continue
+        small = values.astype(dtype)
+        if np.array_equal(small, values, equal_nan=values.dtype.kind == 'f'):
+            df[x] = small
+    return df
+
+
+def clean(df):
+    """Standard column names and types: inode/jnode instead of i_node/j_node, no '@', integer ids/codes (compact())."""
+    df = df.rename(columns={'i_node': 'inode', 'j_node': 'jnode'})
+    df = df.rename(columns=dict([[c, c[1:]] for c in df.columns if c.startswith('@')]))
+    for x in INT_COLS:
+        if x in df.columns:
+            df[x] = df[x].astype(int)
+    for x in df.columns:
+        if x not in INT_COLS and df[x].dtype.kind in 'iu':
+            df[x] = df[x].astype(float)
+    return compact(df)
+
+
+def convert(run):
+    """Parse punchlink.csv and (re)write the typed punchlink.npz. returns the full cleaned table."""
+    csv, store = paths(run)
+    print(f'  -- converting {csv} to typed column file...')
+    key = colstore.source_key(csv)
+    df = clean(pd.read_csv(csv))
+    try:
+        colstore.write_columns(df, store, meta=key)
+    except OSError as e:
+        print(f'  -- could not write {store}: {e}')
+    return df
+
+
+def read_chunks(run, rows):
+    """Cleaned/compact punchlink rows straight from the csv, rows at a time (for runs too big to hold in memory)."""
+    for chunk in pd.read_csv(paths(run)[0], chunksize=rows):
+        yield clean(chunk)
+
+
+def read_punchlink(run, columns=None):
+    """Link rows from a run's punchlink, cleaned/compact (see clean()).
+
+    reads the requested columns (default: all) from punchlink.npz, re-converting from the csv
+    first if the .npz is missing or older than the csv.
+    """
+    csv, store = paths(run)
+    if colstore.is_current(store, csv):
+        return compact(colstore.read_columns(store, columns))
+    df = convert(run)
+    return df[columns].copy() if columns is not None else df
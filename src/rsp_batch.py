@@ -0,0 +1,170 @@
+## RSP_BATCH.PY
+# Batch evaluation of a folder of RSP model runs, spread over a pool of worker processes
+# Does the same work as RSP_Evals_3.ipynb for the stages that don't need Emme:
+#   1. runs congestion_metrics_EDA.py and rsp_emissions_2.py in every run whose outputs are missing
+#      or out of date (build_graph.py)
+#   2. calculates the comparison measures for every RSP run against the no-build (rsp_measures.py)
+# The scripts run inside the workers (runpy) instead of in a new python for each call, so pandas
+# and the shared modules are only imported once per worker. Runs are handed out to workers
+# one whole run at a time, and the comparison table is always written in run name order.
+#
+# Geography/corridor files come from GetRSPCorridorInfo_SingleProject.bat (Emme, then corridor.py or ArcGIS)
+# and must already exist -- runs missing them are reported and left out of the table
+# (build_graph.py rebuilds them, on a machine with Emme).
+#
+# usage: python rsp_batch.py <folder of RSP runs> [--workers N] [--output <csv>] [--params <bca_parameters.csv>] [--tolerance <volume>]
+
+import os
+import sys
+import io
+import runpy
+import argparse
+import contextlib
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+import rsp_measures
+import link_delta
+import nobuild_baseline
+import build_graph
+
+src = os.path.dirname(os.path.abspath(__file__))
+
+#no-build data, loaded once in each worker by load_nobuild()
+_NOBUILD = {}
+
+
+## ------------------------
+## STAGES
+## ------------------------
+
+def run_stages(run, stages):
+    """Rebuild a model run's stale congestion/emissions stages (build_graph.py) in this process, in order.
+
+    returns (run, ok, log text).
+    """
+    log = io.StringIO()
+    ok = True
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        for stage in stages:
+            build_graph.clear_outputs(stage)
+            argv = sys.argv
+            sys.argv = [stage['script']] + list(stage['args'])
+            try:
+                runpy.run_path(stage['script'], run_name='__main__')
+            except (Exception, SystemExit) as e:
+                print(f"{os.path.basename(stage['script'])} failed: {e!r}")
+                ok = False
+                break
+            finally:
+                sys.argv = argv
+            #a script can finish without writing everything (e.g. it catches its own error) -- don't record that as current
+            missing = [f for f in stage['outputs'] if not os.path.exists(f)]
+            if missing:
+                print(f"{os.path.basename(stage['script'])} didn't produce: {', '.join(missing)}")
+                ok = False
+                break
+            build_graph.record(stage)
+    return run, ok, log.getvalue()
+
+
+def load_nobuild(nobuild_dir, params):
+    """Pool initializer -- read the saved no-build baseline (nobuild_baseline.py) once per worker.
+
+    evaluate() brings it up to date first, so the workers only read it.
+    """
+    _NOBUILD['data'] = nobuild_baseline.read(nobuild_dir, params)
+
+
+def run_measures(run, info, params, tol):
+    """rsp_measures.measures() for one run in a worker. returns (run, row or None, log text)."""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            row = rsp_measures.measures(run, info, _NOBUILD['data'], params, tol)
+        except Exception as e:
+            print(f'measures failed: {e!r}')
+            row = None
+    return run, row, log.getvalue()
+
+
+## ------------------------
+## BATCH
+## ------------------------
+
+def evaluate(dir, workers=None, params_file=None, output=None, tol=link_delta.TOLERANCE):
+    """Evaluate every run in a folder of RSP runs. returns the comparison table (also written to output)."""
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    params = rsp_measures.read_parameters(params_file)
+    nobuild, nobuild_dir, rsp_runs_dir = rsp_measures.find_runs(dir)
+    print('RSP repository location: \n', dir, '\n')
+    print("    no-build run:", nobuild)
+    print("    list of model runs:", list(rsp_runs_dir))
+
+    #which outputs are missing or out of date (see build_graph.py)
+    todo = build_graph.plan(build_graph.graph(dir, params_file))
+
+    #geography needs Emme -- runs missing it can't be evaluated here, stale geography is only flagged
+    skipped = {}
+    for stage, reason in todo:
+        if stage['stage'] != 'geography':
+            continue
+        if reason.startswith('output missing') and stage['run'] != nobuild:
+            skipped[stage['run']] = f'geography {reason} -- run GetRSPCorridorInfo_SingleProject.bat first'
+        else:
+            print(f"WARNING: {stage['run']} geography may be out of date ({reason}) -- rerun GetRSPCorridorInfo_SingleProject.bat")
+    runs = dict([[run, info] for run, info in rsp_runs_dir.items() if run not in skipped])
+
+    ## -- 1. congestion and emissions scripts -- ##
+    jobs = {}
+    for stage, reason in todo:
+        if stage['stage'] != 'geography' and stage['run'] not in skipped:
+            jobs.setdefault(stage['run'], []).append(stage)
+    print(f'Running congestion/emissions scripts for {len(jobs)} run(s)...')
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(run_stages, list(jobs), list(jobs.values())))
+        for run, ok, log in done:
+            print(f'---- {run} ----\n{log}')
+            if not ok:
+                if run == nobuild:
+                    raise RuntimeError(f'{nobuild} (no-build) scripts failed, see log above.')
+                skipped[run] = 'congestion/emissions script failed'
+                runs.pop(run)
+
+    ## -- 2. comparison measures -- ##
+    print(f'Calculating measures for {len(runs)} run(s)...')
+    rows = []
+    #rebuild a stale baseline once here -- not in every worker at once, all writing the same file
+    nobuild_baseline.update(nobuild_dir, params)
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_nobuild, initargs=(nobuild_dir, params)) as pool:
+        done = list(pool.map(run_measures, list(runs), list(runs.values()), [params] * len(runs), [tol] * len(runs)))
+    for run, row, log in done:
+        print(log)
+        if row is None:
+            skipped[run] = 'measures failed'
+        else:
+            rows.append(row)
+
+    for run in sorted(skipped):
+        print(f'SKIPPED {run}: {skipped[run]}')
+    if not rows:
+        raise RuntimeError('No RSP runs were evaluated.')
+
+    final_table = rsp_measures.comparison_table(rows)
+    if output:
+        final_table.to_csv(output)
+        print(f'Calculations complete.\n Table exported to {output}')
+    return final_table
+
+
+if __name__ == '__main__':
+    timestamp = dt.datetime.now().strftime("%Y%m%d")
+    parser = argparse.ArgumentParser(description='Evaluate a folder of RSP model runs in parallel.')
+    parser.add_argument('dir', help='folder containing the RSP model runs')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--output', default=os.path.join(os.getcwd(), f'RSP_Comparison_{timestamp}.csv'))
+    parser.add_argument('--params', default=None, help='bca_parameters.csv (default: the one next to this script)')
+    parser.add_argument('--tolerance', type=float, default=link_delta.TOLERANCE,
+                        help='link volume change the link measures ignore (default: 0, exact)')
+    args = parser.parse_args()
+    evaluate(args.dir, workers=args.workers, params_file=args.params, output=args.output, tol=args.tolerance)
@@ -0,0 +1,249 @@
+## RSP_MEASURES.PY
+# RSP comparison measures for one RSP model run against the no-build run
+# Used by RSP_Evals_3.ipynb (one run at a time) and rsp_batch.py (many runs in parallel).
+# Needs the outputs of congestion_metrics_EDA.py, rsp_emissions_2.py and
+# GetRSPCorridorInfo_SingleProject.bat to already exist in each run.
+# Link change measures come from the links that differ from the no-build (link_delta.py), and every
+# no-build value comes from the no-build baseline (nobuild_baseline.py).
+
+import pandas as pd
+import link_keys
+import link_delta
+import congestion_links
+
+
+## ------------------------
+## RUNS AND PARAMETERS
+## ------------------------
+
+#run listing and parameters file (model_runs.py)
+from model_runs import find_runs, read_parameters
+
+
+#congestion link columns the measures use (the links table has every punchlink column)
+LINK_COLS = link_delta.KEYS + link_delta.VALUES + link_delta.ATTRIBUTES + ['len']
+
+
+def read_links(run_dir, columns=LINK_COLS):
+    """A run's congestion links (congestion_metrics_EDA.py), just the given columns, in their congestion_links.SCHEMA types."""
+    return congestion_links.read(run_dir, columns)
+
+
+## ------------------------
+## MEASURES
+## ------------------------
+
+def annual_ka(links, params):
+    """Annual K+A (fatalities and serious injuries) on each link -- rates are per 100M VMT."""
+    #non-interstate rate
+    ka = links['AllVMT'] / 100000000 * params['ann_factor'] * params['SAFE_nikarate']
+    #interstate rate
+    interstate = links['vdf'].isin([2,3,4,5,8])
+    ka[interstate] = links.loc[interstate, 'AllVMT'] / 100000000 * params['ann_factor'] * params['SAFE_ikarate']
+    return ka
+
+
+def measures(run, info, nobuild, params, tol=link_delta.TOLERANCE):
+    """Comparison measures for one RSP run. returns a {column: value} row for the comparison table.
+
+    info:    [<rsp_filepath>, <'link' or 'line'>, <select_link or select_line file>] (from find_runs())
+    nobuild: no-build baseline from nobuild_baseline.read()
+    tol:     link volume change ignored by the link measures (link_delta.delta())
+    """
+    col_val = {}
+    col_val['ID'] = run
+    run_dir, runtype = info[0], info[1]
+    nb = nobuild
+
+    #gather relevant data
+    if runtype == 'link':
+        #gather project link info (packed link keys, see link_keys.py)
+        plinks = link_keys.read_select_links(info[2])
+
+        #rsp network links, and the ones that differ from the no-build
+        rsplink = read_links(run_dir)
+        delta = link_delta.delta(nb, rsplink, tol)
+
+    if runtype == 'line':
+        rsp_trnt = pd.read_csv(run_dir+'\\Database\\data\\transitpunch.csv')
+
+    print(f'Calculations for {run} ({runtype})')
+    if runtype == 'link':
+        print(f'--{len(delta):,} of {len(rsplink):,} links differ from the no-build')
+
+    # 2 - measure_pavement_age
+    # 3 - measure_pavement_condition
+    col_val['measure_pavement_age'] = None
+    col_val['measure_pavement_condition'] = None
+
+    # 4 - measure_safety
+    col_val['measure_safety'] = None
+
+    # 5 - measure_mobility
+    col_val['measure_mobility'] = None
+
+    # 6 - measure_reliability
+    col_val['measure_reliability'] = None
+
+    # 7 - measure_change_in_vmt
+    if runtype == 'link':
+        print('--change in regional vmt')
+        change_vmt = delta['d_AllVMT'].sum()
+        print('    ', int(change_vmt), 'VMT')
+    else:
+        change_vmt = None
+    col_val['measure_change_in_vmt'] = change_vmt
+
+    # 8 - measure_change_in_congested_vht_in_corridor
+    if runtype == 'link':
+        #corridor links on both the nb and rsp networks (select_by_location.py)
+        nb_corridor = link_keys.read_corridor(run_dir+'\\Database\\Select_Link\\nb_corridor_70029.csv')
+        rsp_corridor = link_keys.read_corridor(run_dir+'\\Database\\Select_Link\\rsp_corridor_70029.csv')
+
+        c_change_cvht = link_delta.corridor_change(nb, delta, 'CongestedVHT', nb_corridor, rsp_corridor)
+
+        print('--change in corridor congested VHT')
+        print('    ', int(c_change_cvht), 'VHT')
+    else:
+        c_change_cvht = None
+    col_val['measure_change_in_congested_vht_in_corridor'] = c_change_cvht
+
+    # 9 - measure_change_in_regional_work_trip_travel_time
+    col_val['measure_change_in_regional_work_trip_travel_time'] = None
+
+    # 10 - measure_change_in_work_trip_travel_time_in_corridor
+    col_val['measure_change_in_work_trip_travel_time_in_corridor'] = None
+
+    # 11 - measure_change_in_job_accessibility
+    col_val['measure_change_in_job_accessibility'] = None
+
+    # 12 - measure_change_in_fatalities_and_serious_injuries_per_year
+    if runtype == 'link':
+        #k+a on changed links only -- a link's rate can change with its vdf (no-build k+a from the baseline)
+        orig_ka = delta['annual_ka_nb'].sum()
+        rsp_ka = annual_ka(link_delta.side(delta, 'rsp'), params).sum()
+        change_ka = rsp_ka - orig_ka
+        print('--change in annual roadway fatalities and serious injuries')
+        print('    ', int(change_ka), 'fatalities and serious injuries')
+    else:
+        change_ka = None
+    col_val['measure_change_in_fatalities_and_serious_injuries_per_year'] = change_ka
+
+    # 13 - measure_change_in_congested_vht_for_heavy_trucks_in_corridor
+    if runtype == 'link':
+        change_htruck_cvht_c = link_delta.corridor_change(nb, delta, 'CongestedHTruckVHT', nb_corridor, rsp_corridor)
+        print('--change in congested VHT for heavy trucks in corridor')
+        print('    ', int(change_htruck_cvht_c), 'VHT')
+    else:
+        change_htruck_cvht_c = None
+    col_val['measure_change_in_congested_vht_for_heavy_trucks_in_corridor'] = change_htruck_cvht_c
+
+    # 14 - measure_freight_improvement
+    col_val['measure_freight_improvement'] = None
+
+    # 15 - measure_change_in_greenhouse_gas_emissions
+    # -- split into two, based on rsp_emissions_2.py results: co2, and pm
+    orig_co2 = nobuild['totals']['co2e']
+    orig_pm = nobuild['totals']['pm']
+    rsp_emissions = pd.read_csv(run_dir+'\\Database\\rsp_evaluation\\results\\emissions.csv')
+    rsp_co2 = rsp_emissions.iloc[0,2]
+    rsp_pm = rsp_emissions.iloc[0,3]
+    change_co2 = rsp_co2 - orig_co2
+    change_pm = rsp_pm - orig_pm
+    print('-- change in ghg emissions')
+    print('    CO2: ', change_co2, 'tons')
+    print('    PM:  ', change_pm, 'tons')
+    col_val['measure_change_in_co2_emissions'] = change_co2
+    col_val['measure_change_in_pm_emissions'] = change_pm
+
+    # 16 - measure_change_in_development_pressure_in_conservation_areas
+    col_val['measure_change_in_development_pressure_in_conservation_areas'] = None
+
+    # 17 - measure_direct_impact_on_conservation_areas
+    col_val['measure_direct_impact_on_conservation_areas'] = None
+
+    # 18 - measure_change_in_impervious_area
+    col_val['measure_change_in_impervious_area'] = None
+
+    # 19 - measure_project_use_by_residents_of_economically_disconnected_areas
+    if runtype == 'link':
+        eda_csv = pd.read_csv(run_dir+'\\Database\\rsp_evaluation\\results\\extra_links_70029.csv')
+        cols = eda_csv.columns.tolist()
+        col_change = dict([[col, col.strip()] for col in cols])
+        eda_csv.rename(columns=col_change, inplace=True)
+        #project links only, with their length on the rsp network (once per link -- @ejvol is a daily volume)
+        eda_trips = eda_csv.loc[link_keys.isin(link_keys.keys(eda_csv), plinks)].copy()
+        rsp_index = link_keys.LinkIndex(link_keys.keys(rsplink))
+        eda_trips['len'] = rsp_index.lookup(link_keys.keys(eda_trips), rsplink['len'].to_numpy())
+        eda_trips['vmt'] = eda_trips['@ejvol'] * eda_trips['len']
+
+        trips_eda = eda_trips['vmt'].sum()
+        print('--project use by residents of EDAs')
+        print('    ', int(trips_eda), 'vehicle miles traveled')
+    else:
+        trips_eda = None
+    col_val['measure_project_use_by_residents_of_economically_disconnected_areas'] = trips_eda
+
+    # 20 - measure_change_in_fine_particulate_matter_emissions_in_economically_disconnected_areas
+    col_val['measure_change_in_fine_particulate_matter_emissions_in_economically_disconnected_areas'] = None
+
+    # 21 - measure_change_in_access_to_1_barrier_jobs_for_economically_disconnected_areas
+    col_val['measure_change_in_access_to_1_barrier_jobs_for_economically_disconnected_areas'] = None
+
+    # 22 - measure_economic_impact_due_to_industry_clustering
+    col_val['measure_economic_impact_due_to_industry_clustering'] = None
+
+    # 23 - measure_benefit_to_key_industries
+    col_val['measure_benefit_to_key_industries'] = None
+
+    # 24 - measure_benefits_to_areas_with_industrial_vacancy
+    col_val['measure_benefits_to_areas_with_industrial_vacancy'] = None
+
+    # 25 - measure_transit_asset_condition
+    col_val['measure_transit_asset_condition'] = None
+
+    # 26 - measure_transit_reliability
+    col_val['measure_transit_reliability'] = None
+
+    # 27 - measure_change_in_regional_transit_ridership
+    if runtype == 'line':
+        orig_trnt_trips = nobuild['totals']['voltr']
+        rsp_trnt_trips = rsp_trnt['voltr'].sum()
+        change_trnt_trips = int(rsp_trnt_trips - orig_trnt_trips)
+        print('--change in regional transit ridership')
+        print('    ', change_trnt_trips, 'trips')
+    else:
+        change_trnt_trips = None
+    col_val['measure_change_in_regional_transit_ridership'] = change_trnt_trips
+
+    # 28 - measure_support_of_infill_development
+    col_val['measure_support_of_infill_development'] = None
+
+    # 29 - measure_change_in_congested_vehicle_hours_traveled_in_region
+    if runtype == 'link':
+        r_change_cvht = delta['d_CongestedVHT'].sum()
+        print('--change in regional congested VHT')
+        print('    ', int(r_change_cvht), 'VHT')
+    else:
+        r_change_cvht = None
+    col_val['measure_change_in_congested_vehicle_hours_traveled_in_region'] = r_change_cvht
+
+    # 30 - measure_change_in_congested_vht_for_heavy_trucks_in_region
+    if runtype == 'link':
+        change_htruck_cvht_r = delta['d_CongestedHTruckVHT'].sum()
+        print('--change in congested vht for heavy trucks regionwide')
+        print('    ', int(change_htruck_cvht_r), 'VHT')
+    else:
+        change_htruck_cvht_r = None
+    col_val['measure_change_in_congested_vht_for_heavy_trucks_in_region'] = change_htruck_cvht_r
+
+    # 31 - measure_bike_ped_stuff
+    col_val['measure_bike_ped_stuff'] = None
+
+    return col_val
+
+
+def comparison_table(rows):
+    """Comparison table (one row per RSP run, in the order given) from measures() rows."""
+    rows_df = [pd.Series(row).to_frame().T for row in rows]
+    return pd.concat(rows_df)
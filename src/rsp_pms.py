@@ -0,0 +1,205 @@
+## RSP_PMS.PY
+# Every RSP evaluation stage as a function, and one command line that runs any set of stages for any set
+# of model runs in one process:
+#   export      network geography (and transitpunch.csv) from Emme          export_geog.py
+#   corridor    corridor links around the project                           select_by_location.py
+#   congestion  congestion, K+A and EDA measures                            congestion_metrics_EDA.py
+#   emissions   running emissions                                           rsp_emissions_2.py
+#   bca         benefit-cost analysis (highway projects)                    BCA_calc_3.py
+#   compare     comparison table against the no-build baseline              rsp_measures.py, nobuild_baseline.py
+# Only stages whose outputs are missing or out of date are run (build_graph.py), unless --force -- that
+# includes the comparison table, which is recorded in the no-build's build manifest like any other output.
+# Stage modules, and pandas/numpy with them, are only imported when a stage actually runs, so a
+# re-evaluation with nothing to rebuild just reads manifests and fingerprints files.
+#
+# usage: python rsp_pms.py <folder of RSP runs> [--stages <stage> ...] [--runs <run name> ...]
+#            [--params <bca_parameters.csv>] [--output <comparison csv>] [--tolerance <volume>]
+#            [--chunksize <rows>] [--csv] [--force] [--dry-run]
+#   --stages   default: congestion emissions compare (the stages that don't need Emme)
+#   --runs     default: every run in the folder (the no-build baseline is always kept current for compare)
+#
+# from python, e.g.: import rsp_pms; rsp_pms.run(dir, ['congestion', 'compare'])
+
+import os
+import time
+import argparse
+import datetime as dt
+import build_graph
+import model_runs
+
+src = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = ['export', 'corridor', 'congestion', 'emissions', 'bca', 'compare']
+DEFAULT_STAGES = ['congestion', 'emissions', 'compare']
+#build_graph.py stage each one is (part of)
+GRAPH_STAGES = {
+    'export': 'geography', 'corridor': 'geography', 'congestion': 'congestion',
+    'emissions': 'emissions', 'bca': 'bca', 'compare': 'baseline'
+}
+
+
+## ------------------------
+## STAGES
+## ------------------------
+
+def export(run_dir):
+    """Export a run's network geography, and transitpunch.csv (export_geog.py). Needs Emme or recorded network data."""
+    import export_geog
+    export_geog.export(run_dir)
+
+
+def corridor(run_dir, nobuild_dir):
+    """Select a highway run's corridor links, on its own and the no-build network (select_by_location.py)."""
+    import select_by_location
+    select_by_location.select(run_dir, nobuild_dir)
+
+
+def congestion(run_dir, run, params_file, chunksize=None, export_csv=False):
+    """Congestion factors and the congestion links table for a run (congestion_metrics_EDA.py)."""
+    import congestion_metrics_EDA
+    congestion_metrics_EDA.congestion(run_dir, run, params_file, chunksize=chunksize, export_csv=export_csv)
+
+
+def emissions(run_dir):
+    """Running emissions for a run (rsp_emissions_2.py)."""
+    import rsp_emissions_2
+    rsp_emissions_2.emissions(run_dir)
+
+
+def baseline(nobuild_dir, params_file):
+    """Save the no-build baseline the comparisons use (nobuild_baseline.py)."""
+    import nobuild_baseline
+    nobuild_baseline.write(nobuild_baseline.build(nobuild_dir, model_runs.read_parameters(params_file)))
+
+
+def bca(run_dir, run, params_file):
+    """Benefit-cost analysis for a highway run (BCA_calc_3.py)."""
+    import BCA_calc_3
+    BCA_calc_3.bca(params_file, run_dir, run.split('_')[0])
+
+
+def compare(dir, params_file=None, output=None, runs=None, tol=None):
+    """Comparison table of RSP runs (default all) against the no-build baseline. returns it (also written to output)."""
+    import rsp_measures
+    import nobuild_baseline
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    params = model_runs.read_parameters(params_file)
+    nobuild, nobuild_dir, rsp_runs_dir = model_runs.find_runs(dir)
+    nb = nobuild_baseline.read(nobuild_dir, params)
+    kwargs = {} if tol is None else {'tol': tol}
+    rows = [rsp_measures.measures(run, info, nb, params, **kwargs) for run, info in rsp_runs_dir.items() if runs is None or run in runs]
+    if not rows:
+        raise RuntimeError('No RSP runs to compare.')
+    table = rsp_measures.comparison_table(rows)
+    if output:
+        table.to_csv(output)
+        print(f'Table exported to {output}')
+    return table
+
+
+def run_stage(stage, params_file, chunksize=None, export_csv=False, parts=('export', 'corridor')):
+    """Run one build_graph.py stage in this process. parts: which halves of the geography stage to run."""
+    run, run_dir = stage['run'], stage['run_dir']
+    if stage['stage'] == 'geography':
+        nobuild_dir = stage['args'][0]
+        if 'export' in parts:
+            export(run_dir)
+        if 'corridor' in parts and nobuild_dir != run_dir:
+            corridor(run_dir, nobuild_dir)
+    elif stage['stage'] == 'congestion':
+        congestion(run_dir, run, params_file, chunksize, export_csv)
+    elif stage['stage'] == 'emissions':
+        emissions(run_dir)
+    elif stage['stage'] == 'baseline':
+        baseline(run_dir, params_file)
+    elif stage['stage'] == 'bca':
+        bca(run_dir, run, params_file)
+    else:
+        raise ValueError(f"Unknown stage: {stage['stage']}")
+
+
+## ------------------------
+## RUN
+## ------------------------
+
+def run(dir, stages=DEFAULT_STAGES, runs=None, params_file=None, output=None, tol=None,
+        chunksize=None, export_csv=False, force=False, dry_run=False):
+    """Bring the given stages up to date for the given runs (default all). returns the [stage, reason] list that was (or would be) run."""
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f'Unknown stage(s): {unknown} -- choose from {STAGES}')
+    params_file = params_file or os.path.join(src, 'bca_parameters.csv')
+    nobuild = model_runs.find_runs(dir)[0]
+
+    #model run stages asked for -- the baseline comes with compare whichever runs are asked for
+    wanted = set(GRAPH_STAGES[s] for s in stages)
+    graph = build_graph.graph(dir, params_file, optional=['bca'] if 'bca' in stages else ())
+    selected = [
+        stage for stage in graph
+        if stage['stage'] in wanted and (runs is None or stage['run'] in runs or stage['stage'] == 'baseline')
+    ]
+    todo = [[stage, 'forced'] for stage in selected] if force else build_graph.plan(selected)
+    #geography is export + corridor selection -- with only one of them, it's run but not recorded as current
+    parts = [s for s in ['export', 'corridor'] if s in stages]
+    for stage, reason in todo:
+        print(f"{stage['run']:<15} {stage['stage']:<11} {reason}")
+
+    if not dry_run:
+        for stage, reason in todo:
+            print(f"Running {stage['stage']} for {stage['run']}...")
+            whole = stage['stage'] != 'geography' or len(parts) == 2
+            if whole:
+                build_graph.clear_outputs(stage)
+            run_stage(stage, params_file, chunksize, export_csv, parts)
+            missing = [f for f in stage['outputs'] if not os.path.exists(f)]
+            if whole and missing:
+                raise RuntimeError(f"{stage['stage']} for {stage['run']} didn't produce: {', '.join(missing)}")
+            if whole:
+                build_graph.record(stage)
+
+    if 'compare' in stages:
+        output = output or os.path.join(os.getcwd(), f'RSP_Comparison_{dt.datetime.now().strftime("%Y%m%d")}.csv')
+        #runs without their geography (corridor links, transit segments) can't be compared -- left out, as in rsp_batch.py
+        missing = [
+            stage['run'] for stage in graph
+            if stage['stage'] == 'geography' and stage['run'] != nobuild and not all(os.path.exists(f) for f in stage['outputs'])
+        ]
+        for r in missing:
+            if runs is None or r in runs:
+                print(f'SKIPPED {r}: geography output missing -- run the export and corridor stages (needs Emme) first')
+        rsp_runs = [r for r in model_runs.find_runs(dir)[2] if (runs is None or r in runs) and r not in missing]
+        table = build_graph.compare_stage(dir, output, params_file, rsp_runs)
+        #a table for a given --tolerance isn't recorded, it's always recalculated
+        reason = 'forced' if force else 'tolerance given' if tol is not None else build_graph.stale_reason(table)
+        if reason is None:
+            print(f'Comparison table is current: {output}')
+        else:
+            print(f"{nobuild:<15} {'compare':<11} {reason}")
+            todo.append([table, reason])
+            if not dry_run:
+                build_graph.clear_outputs(table)
+                compare(dir, params_file, output, rsp_runs, tol)
+                if tol is None:
+                    build_graph.record(table)
+    if not todo:
+        print('All outputs are current.')
+    return todo
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(description='Run RSP evaluation stages for a folder of RSP model runs.')
+    parser.add_argument('dir', help='folder containing the RSP model runs')
+    parser.add_argument('--stages', nargs='+', default=DEFAULT_STAGES, choices=STAGES, help='stages to run (default: %(default)s)')
+    parser.add_argument('--runs', nargs='+', default=None, help='model run folder names (default: all)')
+    parser.add_argument('--params', default=None, help='bca_parameters.csv (default: the one next to this script)')
+    parser.add_argument('--output', default=None, help='comparison table csv (default: RSP_Comparison_<date>.csv here)')
+    parser.add_argument('--tolerance', type=float, default=None, help='volume change that counts as a changed link (default: link_delta.TOLERANCE)')
+    parser.add_argument('--chunksize', type=int, default=None, help='stream punchlink this many rows at a time in congestion')
+    parser.add_argument('--csv', action='store_true', help='also export the congestion links as a csv')
+    parser.add_argument('--force', action='store_true', help='run the stages even if their outputs are current')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be run')
+    args = parser.parse_args()
+    run(args.dir, args.stages, args.runs, args.params, args.output, args.tolerance,
+        args.chunksize, args.csv, args.force, args.dry_run)
+    print(f'Finished in {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,111 @@
+## TRANSIT_METRICS.PY
+# Transit segment metrics and costs shared by export_geog.py (transitpunch.csv) and BCA_calc_3.py
+# Works on the segments from network.transit_segments(): every metric and cost column is
+# calculated for all time periods and both modes at once -- hours come from a time period
+# lookup array, bus/rail from the mode column.
+
+import numpy as np
+
+#pmt, pht, vmt, vht -- calculated on all transit segments, regardless of mode
+METRICS = ['trnt_pmt', 'trnt_pht', 'trnt_vmt_1hr', 'trnt_vht_1hr']
+MODES = ['bus', 'rail']
+
+#hours in each transit time period, and description
+TIMEPERIOD_HOURS = {
+    721: {'hours': 12, 'desc': 'Night (6pm-6am)'},
+    723: {'hours': 3, 'desc': 'AM (6am-9am)'},
+    725: {'hours': 7, 'desc': 'Midday (9am-4pm)'},
+    727: {'hours': 2, 'desc': 'PM (4pm-6pm)'}
+}
+
+#cost columns added by costs()
+COST_COLS = [
+    'bus_opcost', 'rail_opcost', 'total_trnt_op_cost', 'total_trnt_emissions_cost',
+    'total_trnt_noise_cost', 'bus_vot', 'rail_vot', 'total_trnt_vot'
+]
+
+
+def hours(timeperiod):
+    """Hours in each segment's time period (NaN for a time period not in TIMEPERIOD_HOURS)."""
+    lookup = np.full(max(TIMEPERIOD_HOURS) + 1, np.nan)
+    lookup[list(TIMEPERIOD_HOURS)] = [TIMEPERIOD_HOURS[tp]['hours'] for tp in TIMEPERIOD_HOURS]
+    tp = np.asarray(timeperiod, dtype=np.int64)
+    found = (tp >= 0) & (tp < len(lookup))
+    return np.where(found, lookup[np.where(found, tp, 0)], np.nan)
+
+
+def metrics(df):
+    """Adds METRICS, plus bus_/rail_ copies of each (NaN on the other mode's segments), to the segments.
+
+    needs len, voltr, us1, hdwy and mode columns. same column order as the old eval loop.
+    """
+    voltr = df['voltr'].to_numpy(dtype=float)
+    length = df['len'].to_numpy(dtype=float)
+    us1 = df['us1'].to_numpy(dtype=float)
+    hdwy = df['hdwy'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = {
+            'trnt_pmt': voltr * length,             ## - pmt: passenger miles traveled
+            'trnt_pht': voltr * us1 / 60,           ## - pht: passenger hours traveled
+            'trnt_vmt_1hr': length * 60 / hdwy,     ## - vmt: vehicle (bus or rail) miles traveled
+            'trnt_vht_1hr': us1 / 60 * 60 / hdwy    ## - vht: vehicle (bus or rail) hours traveled
+        }
+    masks = dict([[mode, (df['mode'] == mode).to_numpy()] for mode in MODES])  ## - bus: b,e,p,q, or l (cta bus or pace). rail: m or c (metra or L)
+
+    columns = {}
+    for m in METRICS:
+        columns[m] = values[m]
+        for mode in MODES:
+            columns[f'{mode}_{m}'] = np.where(masks[mode], values[m], np.nan)
+    return df.assign(**columns)
+
+
+def _fill(values):
+    """0 where a cost is null (segments of the other mode)."""
+    return np.where(np.isnan(values), 0, values)
+
+
+def costs(df, parameters):
+    """Adds COST_COLS (bca_parameters.csv costs, annualized and in present value) to segments from metrics()."""
+    ann, pv = parameters['ann_factor'], parameters['pv_deprec_rate']
+    tp_hours = hours(df['timeperiod'])
+    columns = {}
+
+    #oper costs = (vmt per hour) * (# hours) * (op cost per vmt) * (annualization factor)
+    columns['bus_opcost'] = _fill(df['bus_trnt_vmt_1hr'].to_numpy() * tp_hours * parameters['OC_bus'] * ann * pv)
+    columns['rail_opcost'] = _fill(df['rail_trnt_vmt_1hr'].to_numpy() * tp_hours * parameters['OC_rail'] * ann * pv)
+    columns['total_trnt_op_cost'] = columns['bus_opcost'] + columns['rail_opcost']
+
+    #emissions need moves outputs and noise isn't included yet (bus is in roadway measures, rail excluded in BCA guidance)
+    columns['total_trnt_emissions_cost'] = 0
+    columns['total_trnt_noise_cost'] = 0
+
+    #in-vehicle time -- work trips are 57% of total trips and PHT, non-work is 43% (based on parquet files)
+    vot = 0.57 * parameters['VOT_inv_work'] + 0.43 * parameters['VOT_inv_nw']
+    columns['bus_vot'] = _fill(vot * df['bus_trnt_pht'].to_numpy() * ann * pv)
+    columns['rail_vot'] = _fill(vot * df['rail_trnt_pht'].to_numpy() * ann * pv)
+    columns['total_trnt_vot'] = columns['bus_vot'] + columns['rail_vot']
+    return df.assign(**columns)
+
+
+def statistics(df):
+    """Parameter-independent transit totals (for bca_costs.bca_table): daily bus/rail vehicle miles and passenger hours."""
+    tp_hours = hours(df['timeperiod'])
+    return {
+        'bus_trnt_vmt': np.nansum(df['bus_trnt_vmt_1hr'].to_numpy() * tp_hours),
+        'rail_trnt_vmt': np.nansum(df['rail_trnt_vmt_1hr'].to_numpy() * tp_hours),
+        'bus_trnt_pht': np.nansum(df['bus_trnt_pht'].to_numpy()),
+        'rail_trnt_pht': np.nansum(df['rail_trnt_pht'].to_numpy())
+    }
+
+
+def cost_totals(stats, parameters):
+    """Total transit costs from statistics() -- the sums of the costs() columns."""
+    ann, pv = parameters['ann_factor'], parameters['pv_deprec_rate']
+    vot = 0.57 * parameters['VOT_inv_work'] + 0.43 * parameters['VOT_inv_nw']
+    return {
+        'total_trnt_op_cost': (stats['bus_trnt_vmt'] * parameters['OC_bus'] + stats['rail_trnt_vmt'] * parameters['OC_rail']) * ann * pv,
+        'total_trnt_emissions_cost': 0,
+        'total_trnt_noise_cost': 0,
+        'total_trnt_vot': vot * (stats['bus_trnt_pht'] + stats['rail_trnt_pht']) * ann * pv
+    }